@@ -0,0 +1,111 @@
+"""Response compression with brotli (when installed) or gzip.
+
+Only complete bodies of at least `minimum_size` bytes are compressed. Streamed
+responses such as the order event stream pass through untouched, so events are
+never held back in a compressor buffer.
+"""
+
+import gzip
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is used without it
+    brotli = None
+
+COMPRESSIBLE_TYPES = (b"application/json", b"text/")
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """Maps each accepted coding to its q value."""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.lower()] = quality
+    return accepted
+
+
+def choose_encoding(header: str) -> Optional[str]:
+    accepted = parse_accept_encoding(header)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    for coding in candidates:
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = dict(scope.get("headers") or [])
+        encoding = choose_encoding(request_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether the body is complete
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            body = message.get("body", b"")
+            headers = [(name, value) for name, value in start.get("headers", []) if name != b"content-length"]
+            header_map = dict(start.get("headers", []))
+            compressible = (
+                not message.get("more_body", False)
+                and len(body) >= self.minimum_size
+                and b"content-encoding" not in header_map
+                and header_map.get(b"content-type", b"").startswith(COMPRESSIBLE_TYPES)
+            )
+            if not compressible:
+                await send(start)
+                await send(message)
+                return
+
+            body = self.compress(body, encoding)
+            vary = header_map.get(b"vary")
+            headers = [(name, value) for name, value in headers if name != b"vary"]
+            headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+            headers.append((b"content-encoding", encoding.encode("ascii")))
+            headers.append((b"content-length", str(len(body)).encode("ascii")))
+            # The compressed bytes differ from the entity the ETag names, so it can only be weak
+            headers = [
+                (name, b"W/" + value if name == b"etag" and not value.startswith(b"W/") else value)
+                for name, value in headers
+            ]
+            await send({**start, "headers": headers})
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_wrapper)
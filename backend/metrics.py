@@ -0,0 +1,377 @@
+"""In-process metrics exposed in the Prometheus text format, and latency diagnostics.
+
+Counters, gauges and histograms live in one registry rendered by GET /metrics.
+Each worker process keeps its own values, so with several workers every one of
+them has to be scraped (or aggregated by the collector).
+
+RequestTimings follows one request through auth, storage and serialization so
+slow requests can be logged with a breakdown, and EventLoopWatchdog reports
+whatever code keeps the event loop from running.
+"""
+
+import asyncio
+import functools
+import inspect
+import logging
+import sys
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi.routing import APIRoute
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from sub-millisecond storage calls up to requests stuck behind bcrypt
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    def key(self, labels: dict) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self.key(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def samples(self):
+        return [
+            f"{self.name}{format_labels(self.label_names, key)} {format_value(value)}"
+            for key, value in sorted(self.values.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self.values[self.key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[LabelValues, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [0] * len(self.buckets) + [0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def samples(self):
+        lines = []
+        for key, series in sorted(self.series.items()):
+            for bound, count in zip(self.buckets + (float("inf"),), series[:len(self.buckets)] + [series[-1]]):
+                labels = format_labels(self.label_names + ("le",), key + (format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class RequestTimings:
+    """Where the time of one request went, in seconds."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.endpoint_done: Optional[float] = None
+        self.response_started: Optional[float] = None
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def breakdown(self, finished: float) -> Dict[str, float]:
+        """Milliseconds per phase; serialization runs from the endpoint's return to the first response bytes."""
+        result = {phase: round(seconds * 1000, 1) for phase, seconds in self.phases.items()}
+        if self.endpoint_done is not None and self.response_started is not None:
+            result["serialization"] = round((self.response_started - self.endpoint_done) * 1000, 1)
+        result["total"] = round((finished - self.started) * 1000, 1)
+        return result
+
+
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("current_timings", default=None)
+
+
+def record_phase(phase: str, seconds: float):
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+class timed_phase:
+    """Context manager adding the time spent inside it to a phase of the current request."""
+
+    def __init__(self, phase: str):
+        self.phase = phase
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_phase(self.phase, time.perf_counter() - self.started)
+
+
+class TimedRoute(APIRoute):
+    """Route marking when its endpoint returned, so response serialization can be told apart."""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if inspect.iscoroutinefunction(endpoint):
+            original = endpoint
+
+            @functools.wraps(original)
+            async def endpoint(*args, **kw):
+                try:
+                    return await original(*args, **kw)
+                finally:
+                    timings = current_timings.get()
+                    if timings is not None:
+                        timings.endpoint_done = time.perf_counter()
+
+        super().__init__(path, endpoint, **kwargs)
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware counting requests and timing them per route template and status.
+
+    Event streams are timed up to their first response headers and leave the
+    in-flight gauge at that point, since they stay open for the whole session.
+    Requests slower than `slow_seconds` are logged with their timings breakdown.
+    """
+
+    def __init__(self, app, requests: Histogram, in_flight: Gauge, slow_requests: Optional[Counter] = None,
+                 slow_seconds: float = 0.0, logger: Optional[logging.Logger] = None):
+        self.app = app
+        self.requests = requests
+        self.in_flight = in_flight
+        self.slow_requests = slow_requests
+        self.slow_seconds = slow_seconds
+        self.logger = logger or logging.getLogger(__name__)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        state = {"status": 500, "done": False}
+        self.in_flight.inc()
+
+        def finish():
+            if state["done"]:
+                return
+            state["done"] = True
+            self.in_flight.dec()
+            finished = time.perf_counter()
+            route = getattr(scope.get("route"), "path", "unmatched")
+            elapsed = finished - timings.started
+            self.requests.observe(elapsed, method=scope["method"], route=route, status=state["status"])
+            if self.slow_seconds > 0 and elapsed > self.slow_seconds:
+                if self.slow_requests is not None:
+                    self.slow_requests.inc(method=scope["method"], route=route)
+                breakdown = " ".join(f"{phase}={ms}ms" for phase, ms in timings.breakdown(finished).items())
+                self.logger.warning(f"Slow request {scope['method']} {route} status={state['status']} {breakdown}")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                timings.response_started = time.perf_counter()
+                content_type = dict(message.get("headers") or []).get(b"content-type", b"")
+                if content_type.startswith(b"text/event-stream"):
+                    finish()
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish()
+            current_timings.reset(token)
+
+
+class TimedRepository:
+    """Proxy timing every coroutine method of a repository."""
+
+    def __init__(self, repository, collection: str, histogram: Histogram):
+        self._repository = repository
+        self._collection = collection
+        self._histogram = histogram
+
+    def __getattr__(self, name):
+        attribute = getattr(self._repository, name)
+        if not inspect.iscoroutinefunction(attribute):
+            return attribute
+
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await attribute(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                self._histogram.observe(elapsed, collection=self._collection, operation=name)
+                record_phase("db", elapsed)
+
+        return timed
+
+
+def instrument_storage(storage, histogram: Histogram, collections: Optional[Dict[str, str]] = None):
+    """Wraps the repositories of a storage backend so their calls land in `histogram`."""
+    collections = collections or {
+        "users": "users",
+        "menu": "menu_items",
+        "orders": "orders",
+        "daily_stats": "daily_stats",
+        "tables": "table_states",
+        "idempotency": "idempotency_keys",
+        "revoked_users": "revoked_users",
+        "locks": "locks",
+    }
+    for attribute, collection in collections.items():
+        repository = getattr(storage, attribute)
+        if not isinstance(repository, TimedRepository):
+            setattr(storage, attribute, TimedRepository(repository, collection, histogram))
+    return storage
+
+
+class EventLoopWatchdog:
+    """Samples event loop lag and logs the loop thread's stack when it stays blocked.
+
+    A task on the loop refreshes a heartbeat every `interval` seconds. A separate
+    thread notices when the heartbeat goes stale by more than `block_threshold`
+    and logs the stack the loop thread is stuck in, once per stall.
+    """
+
+    def __init__(self, interval: float, block_threshold: float, on_lag: Optional[Callable[[float], None]] = None,
+                 on_block: Optional[Callable[[], None]] = None, logger: Optional[logging.Logger] = None):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.on_lag = on_lag
+        self.on_block = on_block
+        self.logger = logger or logging.getLogger(__name__)
+        self.heartbeat = time.monotonic()
+        self.blocked_reports = 0
+        self._task = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._beat())
+        if self.block_threshold > 0:
+            self._thread = threading.Thread(target=self._watch, name="event-loop-watchdog", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._thread = None
+
+    async def _beat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.heartbeat = time.monotonic()
+            if self.on_lag is not None:
+                self.on_lag(max(0.0, loop.time() - expected))
+
+    def _watch(self):
+        reported_heartbeat = None
+        while not self._stopped.wait(min(self.interval, self.block_threshold)):
+            heartbeat = self.heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.block_threshold or heartbeat == reported_heartbeat:
+                continue
+            reported_heartbeat = heartbeat
+            self.blocked_reports += 1
+            if self.on_block is not None:
+                self.on_block()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "(loop thread not found)\n"
+            self.logger.warning(f"Event loop blocked for {stalled * 1000:.0f}ms, loop thread stack:\n{stack.rstrip()}")
@@ -1,37 +1,181 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, TypeAdapter
+from pydantic_core import to_json
+from typing import List, Optional, Union
+import json
 import uuid
-from datetime import datetime, timedelta
+import base64
+import bisect
+import hashlib
+import heapq
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, ROUND_HALF_UP
+from functools import partial
+from zoneinfo import ZoneInfo
+import time
 import jwt
 import bcrypt
 
+try:
+    import orjson
+except ImportError:  # optional, hot endpoints fall back to pydantic's serializer
+    orjson = None
+
+from compression import CompressionMiddleware
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    EventLoopWatchdog,
+    MetricsRegistry,
+    RequestMetricsMiddleware,
+    TimedRoute,
+    instrument_storage,
+    timed_phase,
+)
+from storage import create_storage, patch_rewrites_items
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Metrics exposed by GET /metrics
+metrics = MetricsRegistry()
+REQUEST_SECONDS = metrics.histogram("http_request_duration_seconds", "HTTP request latency by route and status", ["method", "route", "status"])
+REQUESTS_IN_FLIGHT = metrics.gauge("http_requests_in_flight", "HTTP requests being handled")
+STORAGE_SECONDS = metrics.histogram("storage_operation_duration_seconds", "Storage call latency by collection and operation", ["collection", "operation"])
+PASSWORD_HASH_SECONDS = metrics.histogram("password_hash_duration_seconds", "Time spent in bcrypt by operation", ["operation"])
+PASSWORD_WAIT_SECONDS = metrics.histogram("password_queue_wait_seconds", "Time bcrypt jobs waited for a worker", ["operation"])
+PASSWORD_REJECTED = metrics.counter("password_jobs_rejected_total", "bcrypt jobs rejected because the pool was saturated")
+EVENT_LOOP_LAG_SECONDS = metrics.histogram("event_loop_lag_seconds", "Delay of a scheduled wakeup on the event loop")
+EVENT_LOOP_LAG_LAST = metrics.gauge("event_loop_lag_last_seconds", "Last measured event loop lag")
+EVENT_LOOP_BLOCKED = metrics.counter("event_loop_blocked_total", "Event loop stalls longer than the block threshold")
+SLOW_REQUESTS = metrics.counter("http_slow_requests_total", "Requests slower than the slow request budget", ["method", "route"])
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # when set, GET /metrics requires it as a bearer token
+EVENT_LOOP_LAG_INTERVAL_SECONDS = float(os.environ.get('EVENT_LOOP_LAG_INTERVAL_SECONDS', '0.5'))
+
+# Watchdog settings: loop stalls above the threshold log the blocking stack, 0 disables
+EVENT_LOOP_BLOCK_THRESHOLD_SECONDS = float(os.environ.get('EVENT_LOOP_BLOCK_THRESHOLD_SECONDS', '0.25'))
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '500'))
+
+# Storage backend: mongo, or memory for tests and benchmarks
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo')
+storage = instrument_storage(
+    create_storage(STORAGE_BACKEND, os.environ.get('MONGO_URL'), os.environ.get('DB_NAME')), STORAGE_SECONDS
+)
 
 # Create the main app without a prefix
 app = FastAPI()
 
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=TimedRoute)
 
 # JWT Settings
 JWT_SECRET = "edrina_resto_secret_key_2024"
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24
 
+# User cache settings
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', '60'))
+# When enabled, sub/role/username claims of a valid token are trusted without a user lookup
+AUTH_TRUST_TOKEN_CLAIMS = os.environ.get('AUTH_TRUST_TOKEN_CLAIMS', 'false').lower() == 'true'
+# Revocations are shared through storage, each worker reloads them at most this often (0 on every request)
+AUTH_REVOCATION_SYNC_SECONDS = float(os.environ.get('AUTH_REVOCATION_SYNC_SECONDS', '5'))
+
+# Password hashing settings
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+PASSWORD_POOL_KIND = os.environ.get('PASSWORD_POOL_KIND', 'thread')  # thread or process
+PASSWORD_POOL_WORKERS = int(os.environ.get('PASSWORD_POOL_WORKERS', '4'))
+PASSWORD_POOL_MAX_QUEUE = int(os.environ.get('PASSWORD_POOL_MAX_QUEUE', '32'))
+
+# Order event stream settings
+ORDER_EVENTS_BUFFER_SIZE = int(os.environ.get('ORDER_EVENTS_BUFFER_SIZE', '1000'))
+ORDER_EVENTS_QUEUE_SIZE = int(os.environ.get('ORDER_EVENTS_QUEUE_SIZE', '256'))
+ORDER_EVENTS_KEEPALIVE_SECONDS = float(os.environ.get('ORDER_EVENTS_KEEPALIVE_SECONDS', '15'))
+# EventSource cannot send headers, browsers open the stream with a ticket this short-lived instead of their token
+ORDER_EVENTS_TICKET_SECONDS = float(os.environ.get('ORDER_EVENTS_TICKET_SECONDS', '30'))
+ORDER_EVENTS_TICKET_AUDIENCE = "order-events"
+
+# Delta sync settings
+ORDERS_SYNC_OVERLAP_SECONDS = float(os.environ.get('ORDERS_SYNC_OVERLAP_SECONDS', '2'))
+ORDERS_SYNC_MAX_CHANGES = int(os.environ.get('ORDERS_SYNC_MAX_CHANGES', '1000'))
+
+# Menu cache settings
+MENU_CACHE_TTL_SECONDS = float(os.environ.get('MENU_CACHE_TTL_SECONDS', '60'))
+MENU_CACHE_MAX_AGE = int(os.environ.get('MENU_CACHE_MAX_AGE', '30'))
+
+# Pagination settings for list endpoints
+PAGE_SIZE_DEFAULT = int(os.environ.get('PAGE_SIZE_DEFAULT', '200'))
+PAGE_SIZE_MAX = int(os.environ.get('PAGE_SIZE_MAX', '1000'))
+
+# Serialize hot list endpoints with orjson when it is installed
+FAST_JSON = os.environ.get('FAST_JSON', 'true').lower() == 'true' and orjson is not None
+
+# Responses of at least this many bytes are compressed (brotli when installed, else gzip)
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+
+# Fields returned by ?view=summary on order lists, enough for the dashboard cards
+ORDER_SUMMARY_FIELDS = ["id", "table_number", "status", "total_amount", "created_at"]
+
+# Archiving: paid orders older than this move to orders_archive, 0 disables the background archiver
+ORDERS_ARCHIVE_AFTER_HOURS = float(os.environ.get('ORDERS_ARCHIVE_AFTER_HOURS', '72'))
+ORDERS_ARCHIVE_INTERVAL_SECONDS = float(os.environ.get('ORDERS_ARCHIVE_INTERVAL_SECONDS', '3600'))
+ORDERS_ARCHIVE_BATCH_SIZE = int(os.environ.get('ORDERS_ARCHIVE_BATCH_SIZE', '500'))
+
+# Lifecycle of an order, used to find orders that moved out of a role's view
+ORDER_STATUS_FLOW = ["pending", "in_kitchen", "ready", "paid"]
+# Orders still occupying their table
+OPEN_ORDER_STATUSES = ["pending", "in_kitchen", "ready"]
+# Kitchen progress of a single order line
+ITEM_STATUSES = ["queued", "cooking", "done"]
+
+# Tables of the floor plan, numbered from 1
+TABLE_COUNT = int(os.environ.get('TABLE_COUNT', '8'))
+
+# Most orders shown on the kitchen screen, oldest first (the to-prepare counts cover all of them)
+KITCHEN_QUEUE_LIMIT = int(os.environ.get('KITCHEN_QUEUE_LIMIT', '200'))
+
+# Open orders whose dishes still have to be cooked
+KITCHEN_PREP_STATUSES = ["pending", "in_kitchen"]
+
+# Most orders a single bulk status change may name
+BULK_STATUS_MAX_ORDERS = int(os.environ.get('BULK_STATUS_MAX_ORDERS', '200'))
+
+# Idempotency-Key: how long a completed response is replayed, and how long an unfinished request holds its key
+IDEMPOTENCY_TTL_HOURS = float(os.environ.get('IDEMPOTENCY_TTL_HOURS', '24'))
+IDEMPOTENCY_PENDING_SECONDS = float(os.environ.get('IDEMPOTENCY_PENDING_SECONDS', '60'))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# Statistics settings
+STATS_TIMEZONE = os.environ.get('STATS_TIMEZONE', 'Africa/Tunis')
+STATS_TOP_ITEMS = int(os.environ.get('STATS_TOP_ITEMS', '10'))
+STATS_TZ = ZoneInfo(STATS_TIMEZONE)
+DAILY_STATS_SEED_BATCH_SIZE = 500
+
+# Longest a rebuild or seeding may hold its lock before another worker can take over
+MAINTENANCE_LOCK_SECONDS = float(os.environ.get('MAINTENANCE_LOCK_SECONDS', '600'))
+
+# Status transitions: target status -> (role allowed, required current status, timestamp field)
+ORDER_TRANSITIONS = {
+    "ready": ("chef", "in_kitchen", "kitchen_ready_at"),
+    "paid": ("caisse", "ready", "paid_at"),
+}
+
+# Order statuses each role works with (serveur sees its own orders, admin sees all)
+ROLE_ORDER_STATUSES = {
+    "chef": ["in_kitchen", "ready"],
+    "caisse": ["ready", "paid"],
+}
+
 # Security
 security = HTTPBearer()
 
@@ -75,6 +219,8 @@ class OrderItem(BaseModel):
     menu_item_name: str
     quantity: int
     price: float
+    line_id: Optional[str] = None  # assigned when the order is priced, None on lines stored before
+    status: str = "queued"  # "queued", "cooking", "done"
 
 class Order(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -88,6 +234,7 @@ class Order(BaseModel):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     kitchen_ready_at: Optional[datetime] = None
     paid_at: Optional[datetime] = None
+    version: int = 0  # bumped by every item edit
 
 class OrderCreate(BaseModel):
     table_number: int
@@ -96,14 +243,238 @@ class OrderCreate(BaseModel):
 class OrderUpdate(BaseModel):
     items: Optional[List[OrderItem]] = None
     status: Optional[str] = None
+    version: Optional[int] = None  # when given, items are only replaced on this version
+
+class BulkStatusUpdate(BaseModel):
+    order_ids: List[str]
+    status: str
+
+class BulkStatusResult(BaseModel):
+    id: str
+    result: str  # "updated", "not_found", "conflict"
+    status: Optional[str] = None  # status of the order after the request
+
+class BulkStatusResponse(BaseModel):
+    updated: int
+    results: List[BulkStatusResult]
+
+class OrderItemChange(BaseModel):
+    op: str  # "add", "remove", "quantity"
+    menu_item_id: Optional[str] = None  # add
+    line_id: Optional[str] = None  # remove, quantity
+    quantity: Optional[int] = None  # add, quantity (0 removes the line)
+
+class OrderPatch(BaseModel):
+    version: int  # the version the changes were made against
+    changes: List[OrderItemChange]
+
+class ItemStatusUpdate(BaseModel):
+    status: str
+
+class OrderDelta(BaseModel):
+    orders: List[Order]
+    removed: List[str]  # ids of orders no longer visible to the caller
+    cursor: datetime
+    has_more: bool = False
+    after_id: Optional[str] = None  # with has_more, sent back with the cursor to resume after the last order
+
+class TableOrder(BaseModel):
+    id: str
+    status: str
+    total_amount: float
+    created_at: datetime
+
+class TableState(BaseModel):
+    table_number: int
+    status: str = "free"  # free, or the most advanced status among open orders
+    open_orders: List[TableOrder] = []
+    running_total: float = 0.0
+    oldest_open_at: Optional[datetime] = None
+    computed_at: Optional[datetime] = None
+
+class PrepItem(BaseModel):
+    menu_item_id: str
+    name: str
+    quantity: int  # on lines not done yet
+    cooking: int = 0  # part of quantity already being cooked
+    orders: int  # number of orders asking for it
+    oldest_at: datetime  # creation of the oldest of those orders
+
+class KitchenQueue(BaseModel):
+    orders: List[Order]
+    to_prepare: List[PrepItem]
+
+class UserCache:
+    """In-process cache of authenticated users with TTL and a copy of the revocation list."""
+
+    def __init__(self, ttl_seconds: float, revocation_sync_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.revocation_sync_seconds = revocation_sync_seconds
+        self._entries = {}  # user_id -> (expires_at, User)
+        self._revoked = {}  # user_id -> revocation expiry (tokens cannot outlive it)
+        self._revocations_synced_at = None
+        self.hits = 0
+        self.misses = 0
+        self.claim_hits = 0
+        self.invalidations = 0
+
+    def get(self, user_id: str) -> Optional["User"]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            self.misses += 1
+            return None
+        self.hits += 1
+        return user
+
+    def set(self, user: "User"):
+        if self.ttl_seconds > 0:
+            self._entries[user.id] = (time.monotonic() + self.ttl_seconds, user)
+
+    def invalidate(self, user_id: str):
+        if self._entries.pop(user_id, None) is not None:
+            self.invalidations += 1
+
+    def revoke(self, user_id: str, seconds: float):
+        self.invalidate(user_id)
+        self._revoked[user_id] = time.monotonic() + seconds
+    
+    async def sync_revocations(self):
+        """Picks up revocations made by other workers or before a restart."""
+        if self._revocations_synced_at is not None and (
+            time.monotonic() - self._revocations_synced_at < self.revocation_sync_seconds
+        ):
+            return
+        # Marked before the read so concurrent requests don't all reload
+        self._revocations_synced_at = time.monotonic()
+        now = datetime.utcnow()
+        for revocation in await storage.revoked_users.list_active(now):
+            self.revoke(revocation["user_id"], (revocation["expires_at"] - now).total_seconds())
+
+    def is_revoked(self, user_id: str) -> bool:
+        expires_at = self._revoked.get(user_id)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del self._revoked[user_id]
+            return False
+        return True
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "ttl_seconds": self.ttl_seconds,
+            "trust_token_claims": AUTH_TRUST_TOKEN_CLAIMS,
+            "size": len(self._entries),
+            "revoked": len(self._revoked),
+            "hits": self.hits,
+            "misses": self.misses,
+            "claim_hits": self.claim_hits,
+            "invalidations": self.invalidations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+user_cache = UserCache(USER_CACHE_TTL_SECONDS, AUTH_REVOCATION_SYNC_SECONDS)
 
 # Helper Functions
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+def _timed_password_job(fn, submitted_at: float, *args):
+    # Wall clock so the wait can be measured across process boundaries
+    started_at = time.time()
+    result = fn(*args)
+    return result, started_at - submitted_at, time.time() - started_at
+
+class PasswordWorkerPool:
+    """Bounded pool running bcrypt off the event loop, rejecting work once saturated."""
+
+    def __init__(self, kind: str, max_workers: int, max_queue: int):
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            PASSWORD_REJECTED.inc()
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many authentication requests, please retry",
+                headers={"Retry-After": "1"},
+            )
+        
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            with timed_phase("password"):
+                result, wait_seconds, hash_seconds = await loop.run_in_executor(
+                    self._get_executor(), _timed_password_job, fn, time.time(), *args
+                )
+        finally:
+            self.pending -= 1
+        
+        self.completed += 1
+        self.wait_seconds_total += wait_seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+        self.hash_seconds_total += hash_seconds
+        self.hash_seconds_max = max(self.hash_seconds_max, hash_seconds)
+        PASSWORD_WAIT_SECONDS.observe(wait_seconds, operation=fn.__name__)
+        PASSWORD_HASH_SECONDS.observe(hash_seconds, operation=fn.__name__)
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "kind": self.kind,
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_ms_avg": round(self.wait_seconds_total / completed * 1000, 3),
+            "wait_ms_max": round(self.wait_seconds_max * 1000, 3),
+            "hash_ms_avg": round(self.hash_seconds_total / completed * 1000, 3),
+            "hash_ms_max": round(self.hash_seconds_max * 1000, 3),
+        }
+
+password_pool = PasswordWorkerPool(PASSWORD_POOL_KIND, PASSWORD_POOL_WORKERS, PASSWORD_POOL_MAX_QUEUE)
+
+async def hash_password_async(password: str) -> str:
+    return await password_pool.run(hash_password, password)
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await password_pool.run(verify_password, password, hashed)
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
@@ -111,32 +482,62 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def credentials_exception(detail: str = "Could not validate credentials"):
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+async def load_user(user_id: str) -> Optional[User]:
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    
+    user_doc = await storage.users.get(user_id)
+    if user_doc is None:
+        return None
+    
+    user = User(**user_doc)
+    user_cache.set(user)
+    return user
+
+async def authenticate_token(token: str, audience: Optional[str] = None) -> User:
+    # Tokens with an audience (stream tickets) are refused wherever no audience is expected
     try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        user = await db.users.find_one({"id": user_id})
-        if user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        return User(**user)
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM], audience=audience)
     except jwt.PyJWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise credentials_exception()
+    
+    user_id: str = payload.get("sub")
+    if user_id is None:
+        raise credentials_exception()
+    
+    await user_cache.sync_revocations()
+    if user_cache.is_revoked(user_id):
+        raise credentials_exception("User not found")
+    
+    # Tokens issued before the username claim existed fall back to a lookup
+    if AUTH_TRUST_TOKEN_CLAIMS and payload.get("role") and payload.get("username"):
+        user_cache.claim_hits += 1
+        return User(id=user_id, username=payload["username"], role=payload["role"], password_hash="")
+    
+    user = await load_user(user_id)
+    if user is None:
+        raise credentials_exception("User not found")
+    
+    return user
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    with timed_phase("auth"):
+        return await authenticate_token(credentials.credentials)
+
+def order_visible_to(user: User, order: dict) -> bool:
+    if user.role == "admin":
+        return True
+    if user.role == "serveur":
+        return order["server_id"] == user.id
+    return order["status"] in ROLE_ORDER_STATUSES.get(user.role, [])
 
 # Authentication Routes
 @api_router.post("/auth/register")
@@ -146,7 +547,7 @@ async def register_user(user_data: UserCreate, current_user: User = Depends(get_
         raise HTTPException(status_code=403, detail="Only admin can register new users")
     
     # Check if username already exists
-    existing_user = await db.users.find_one({"username": user_data.username})
+    existing_user = await storage.users.get_by_username(user_data.username)
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already exists")
     
@@ -157,20 +558,21 @@ async def register_user(user_data: UserCreate, current_user: User = Depends(get_
     # Create new user
     user = User(
         username=user_data.username,
-        password_hash=hash_password(user_data.password),
+        password_hash=await hash_password_async(user_data.password),
         role=user_data.role
     )
     
-    await db.users.insert_one(user.dict())
+    await storage.users.insert(user.dict())
+    user_cache.set(user)
     return {"message": "User created successfully", "user": UserResponse(**user.dict())}
 
 @api_router.post("/auth/login")
 async def login_user(user_data: UserLogin):
-    user = await db.users.find_one({"username": user_data.username})
-    if not user or not verify_password(user_data.password, user["password_hash"]):
+    user = await storage.users.get_by_username(user_data.username)
+    if not user or not await verify_password_async(user_data.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    access_token = create_access_token(data={"sub": user["id"], "role": user["role"]})
+    access_token = create_access_token(data={"sub": user["id"], "role": user["role"], "username": user["username"]})
     return {
         "access_token": access_token,
         "token_type": "bearer",
@@ -179,15 +581,40 @@ async def login_user(user_data: UserLogin):
 
 @api_router.get("/auth/me")
 async def get_me(current_user: User = Depends(get_current_user)):
+    if AUTH_TRUST_TOKEN_CLAIMS:
+        # Claims carry no created_at, resolve the full profile
+        user = await load_user(current_user.id)
+        if user is None:
+            raise credentials_exception("User not found")
+        return UserResponse(**user.dict())
     return UserResponse(**current_user.dict())
 
+@api_router.get("/auth/cache-stats")
+async def get_user_cache_stats(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return user_cache.stats()
+
+@api_router.get("/auth/hash-stats")
+async def get_password_pool_stats(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return password_pool.stats()
+
 # User Management Routes (Admin only)
 @api_router.get("/users", response_model=List[UserResponse])
-async def get_users(current_user: User = Depends(get_current_user)):
+async def get_users(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1),
+    after: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    users = await db.users.find().to_list(1000)
+    users = await find_page(storage.users.list_page, response, limit, after)
     return [UserResponse(**user) for user in users]
 
 @api_router.delete("/users/{user_id}")
@@ -198,12 +625,184 @@ async def delete_user(user_id: str, current_user: User = Depends(get_current_use
     if user_id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
     
-    result = await db.users.delete_one({"id": user_id})
-    if result.deleted_count == 0:
+    if not await storage.users.delete(user_id):
         raise HTTPException(status_code=404, detail="User not found")
     
+    # Outstanding tokens of the deleted user must stop working immediately, on every worker
+    await storage.revoked_users.add(user_id, datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS))
+    user_cache.revoke(user_id, JWT_EXPIRATION_HOURS * 3600)
+    
     return {"message": "User deleted successfully"}
 
+# Menu Snapshot
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+class MenuSnapshot:
+    """Immutable copy of the menu with its serialized body and ETag."""
+
+    def __init__(self, items: List[MenuItem]):
+        self.items = items  # in (created_at, id) order
+        self.keys = [(item.created_at, item.id) for item in items]
+        self.by_id = {item.id: item for item in items}
+        self.body = dump_json([item.dict() for item in items])
+        # Derived from the content so every worker and restart agrees on it
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()[:20]}"'
+
+    def page(self, limit: Optional[int], after: Optional[str]):
+        limit = min(limit or PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX)
+        start = bisect.bisect_right(self.keys, parse_page_cursor(after)) if after else 0
+        items = self.items[start:start + limit]
+        next_cursor = None
+        if start + limit < len(self.items):
+            next_cursor = encode_page_cursor({"created_at": items[-1].created_at, "id": items[-1].id})
+        return items, next_cursor
+
+class MenuCache:
+    """Holds the current menu snapshot, dropped on menu mutations and after a TTL."""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.generation = 0
+        self.loads = 0
+        self._snapshot = None
+        self._expires_at = 0.0
+
+    def invalidate(self):
+        self.generation += 1
+        self._snapshot = None
+
+    async def get(self) -> MenuSnapshot:
+        if self._snapshot is not None and self._expires_at > time.monotonic():
+            return self._snapshot
+        
+        generation = self.generation
+        docs = await storage.menu.list_all()
+        snapshot = MenuSnapshot([MenuItem(**doc) for doc in docs])
+        self.loads += 1
+        # A mutation during the read means this copy may already be stale, serve it but don't keep it
+        if generation == self.generation:
+            self._snapshot = snapshot
+            self._expires_at = time.monotonic() + self.ttl_seconds
+        return snapshot
+
+menu_cache = MenuCache(MENU_CACHE_TTL_SECONDS)
+
+def to_millimes(amount: float) -> int:
+    # 1 TND = 1000 millimes, go through str so 15.5 is not 15.4999...
+    return int((Decimal(str(amount)) * 1000).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+async def price_order_items(items: List[OrderItem], stored_items: Optional[List[dict]] = None):
+    """Replaces client names and prices with the menu's, returns the items and their exact total.
+    
+    New orders get fresh lines. Edits (`stored_items` given) keep the id and kitchen status of
+    the stored lines they name, lines without an id are new.
+    """
+    # Same rule as build_items_patch, whichever path writes the items
+    if not items:
+        raise HTTPException(status_code=400, detail="An order must keep at least one item")
+    
+    snapshot = await menu_cache.get()
+    stored_lines = {item["line_id"]: item for item in stored_items or [] if item.get("line_id")}
+    priced_items = []
+    seen_lines = set()
+    total_millimes = 0
+    for item in items:
+        menu_item = snapshot.by_id.get(item.menu_item_id)
+        if menu_item is None:
+            raise HTTPException(status_code=400, detail=f"Unknown menu item: {item.menu_item_id}")
+        if item.quantity < 1:
+            raise HTTPException(status_code=400, detail="Quantity must be at least 1")
+        
+        line_id, line_status = str(uuid.uuid4()), "queued"
+        if stored_items is not None and item.line_id is not None:
+            stored_line = stored_lines.get(item.line_id)
+            if stored_line is None:
+                raise HTTPException(status_code=400, detail=f"Unknown order line: {item.line_id}")
+            if item.line_id in seen_lines:
+                raise HTTPException(status_code=400, detail=f"Order line given twice: {item.line_id}")
+            seen_lines.add(item.line_id)
+            line_id = item.line_id
+            # The kitchen owns line status, extra portions of a line still have to be cooked
+            if item.quantity <= stored_line["quantity"]:
+                line_status = stored_line.get("status", "queued")
+        
+        priced_items.append(OrderItem(
+            menu_item_id=menu_item.id,
+            menu_item_name=menu_item.name,
+            quantity=item.quantity,
+            price=menu_item.price,
+            line_id=line_id,
+            status=line_status,
+        ))
+        total_millimes += to_millimes(menu_item.price) * item.quantity
+    
+    return priced_items, total_millimes / 1000
+
+async def build_items_patch(items: List[dict], changes: List[OrderItemChange]):
+    """Checks an item diff against the stored lines, returns the storage patch and the new total."""
+    snapshot = await menu_cache.get()
+    lines = {item["line_id"]: item for item in items if item.get("line_id")}
+    patch = {"add": [], "remove": [], "quantity": {}}
+    touched = set()
+    for change in changes:
+        if change.op == "add":
+            menu_item = snapshot.by_id.get(change.menu_item_id)
+            if menu_item is None:
+                raise HTTPException(status_code=400, detail=f"Unknown menu item: {change.menu_item_id}")
+            if change.quantity is None or change.quantity < 1:
+                raise HTTPException(status_code=400, detail="Quantity must be at least 1")
+            patch["add"].append(OrderItem(
+                menu_item_id=menu_item.id,
+                menu_item_name=menu_item.name,
+                quantity=change.quantity,
+                price=menu_item.price,
+                line_id=str(uuid.uuid4()),
+            ).dict())
+            continue
+        
+        if change.op not in ["remove", "quantity"]:
+            raise HTTPException(status_code=400, detail=f"Invalid change: {change.op}")
+        line = lines.get(change.line_id)
+        if line is None:
+            raise HTTPException(status_code=400, detail=f"Unknown order line: {change.line_id}")
+        if change.line_id in touched:
+            raise HTTPException(status_code=400, detail=f"Order line changed twice: {change.line_id}")
+        touched.add(change.line_id)
+        
+        if change.op == "remove" or change.quantity == 0:
+            patch["remove"].append(change.line_id)
+        elif change.quantity is None or change.quantity < 0:
+            raise HTTPException(status_code=400, detail="Quantity must be at least 1")
+        elif change.quantity != line["quantity"]:
+            patch["quantity"][change.line_id] = change.quantity - line["quantity"]
+    
+    merged = []
+    for item in items:
+        line_id = item.get("line_id")
+        if line_id in patch["remove"]:
+            continue
+        delta = patch["quantity"].get(line_id)
+        if delta is not None:
+            item = {**item, "quantity": item["quantity"] + delta}
+            if delta > 0:
+                # Extra portions of a line the kitchen already finished still have to be cooked
+                item["status"] = "queued"
+        merged.append(item)
+    patch["items"] = merged + patch["add"]
+    if not patch["items"]:
+        raise HTTPException(status_code=400, detail="An order must keep at least one item")
+    
+    total_millimes = sum(to_millimes(item["price"]) * item["quantity"] for item in patch["items"])
+    return patch, total_millimes / 1000
+
+def version_condition(version: int):
+    # Orders stored before versioning have no version field and count as version 0
+    return [0, None] if version == 0 else version
+
 # Menu Management Routes
 @api_router.post("/menu", response_model=MenuItem)
 async def create_menu_item(item: MenuItemCreate, current_user: User = Depends(get_current_user)):
@@ -211,27 +810,33 @@ async def create_menu_item(item: MenuItemCreate, current_user: User = Depends(ge
         raise HTTPException(status_code=403, detail="Admin or Chef access required")
     
     menu_item = MenuItem(**item.dict())
-    await db.menu_items.insert_one(menu_item.dict())
+    await storage.menu.insert(menu_item.dict())
+    menu_cache.invalidate()
     return menu_item
 
 @api_router.get("/menu", response_model=List[MenuItem])
-async def get_menu_items():
-    menu_items = await db.menu_items.find().to_list(1000)
-    return [MenuItem(**item) for item in menu_items]
+async def get_menu_items(request: Request, limit: Optional[int] = Query(None, ge=1), after: Optional[str] = None):
+    snapshot = await menu_cache.get()
+    headers = {"ETag": snapshot.etag, "Cache-Control": f"public, max-age={MENU_CACHE_MAX_AGE}"}
+    if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    
+    items, next_cursor = snapshot.page(limit, after)
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    # The common whole-menu request reuses the pre-serialized body
+    body = snapshot.body if len(items) == len(snapshot.items) else dump_json([item.dict() for item in items])
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @api_router.put("/menu/{item_id}")
 async def update_menu_item(item_id: str, item: MenuItemCreate, current_user: User = Depends(get_current_user)):
     if current_user.role not in ["admin", "chef"]:
         raise HTTPException(status_code=403, detail="Admin or Chef access required")
     
-    result = await db.menu_items.update_one(
-        {"id": item_id}, 
-        {"$set": item.dict()}
-    )
-    
-    if result.modified_count == 0:
+    if not await storage.menu.update(item_id, item.dict()):
         raise HTTPException(status_code=404, detail="Menu item not found")
     
+    menu_cache.invalidate()
     return {"message": "Menu item updated successfully"}
 
 @api_router.delete("/menu/{item_id}")
@@ -239,121 +844,939 @@ async def delete_menu_item(item_id: str, current_user: User = Depends(get_curren
     if current_user.role not in ["admin", "chef"]:
         raise HTTPException(status_code=403, detail="Admin or Chef access required")
     
-    result = await db.menu_items.delete_one({"id": item_id})
-    if result.deleted_count == 0:
+    if not await storage.menu.delete(item_id):
         raise HTTPException(status_code=404, detail="Menu item not found")
     
+    menu_cache.invalidate()
     return {"message": "Menu item deleted successfully"}
 
+# Pagination
+def encode_page_cursor(doc: dict) -> str:
+    raw = json.dumps([doc["created_at"].isoformat(), doc["id"]])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def parse_page_cursor(after: str):
+    try:
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(after.encode('ascii')))
+        return datetime.fromisoformat(created_at), item_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid page cursor")
+
+async def find_page(list_page, response: Response, limit: Optional[int], after: Optional[str]) -> List[dict]:
+    """Reads one page in the (created_at, id) keyset order of list_page, sets X-Next-Cursor when more rows follow."""
+    limit = min(limit or PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX)
+    
+    # One extra row tells whether another page exists
+    docs = await list_page(limit + 1, parse_page_cursor(after) if after else None)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers["X-Next-Cursor"] = encode_page_cursor(docs[-1])
+    return docs
+
+def parse_order_fields(fields: Optional[str], view: Optional[str]) -> Optional[List[str]]:
+    """Projection asked for with ?fields= or ?view=summary, None for full orders."""
+    if view not in (None, "full", "summary"):
+        raise HTTPException(status_code=400, detail="View must be full or summary")
+    if fields and view is not None:
+        raise HTTPException(status_code=400, detail="Use either fields or view, not both")
+    
+    if view == "summary":
+        requested = ORDER_SUMMARY_FIELDS
+    elif fields:
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in requested if field not in Order.model_fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown order fields: {', '.join(unknown)}")
+    else:
+        return None
+    
+    # The page cursor is built from id and created_at, so they always come along
+    return list(dict.fromkeys(["id", "created_at", *requested]))
+
+def dump_json(content) -> bytes:
+    """JSON for plain data (dicts, lists, naive datetimes as ISO 8601), same output either way."""
+    if FAST_JSON:
+        return orjson.dumps(content)
+    return to_json(content)
+
+order_list_adapter = TypeAdapter(List[Order])
+
+# Order fields added after the first release, older documents may lack them
+ORDER_FIELD_DEFAULTS = {
+    name: field.default for name, field in Order.model_fields.items()
+    if not field.is_required() and field.default_factory is None
+}
+ITEM_FIELD_DEFAULTS = {
+    name: field.default for name, field in OrderItem.model_fields.items()
+    if not field.is_required() and field.default_factory is None
+}
+
+def dump_orders(orders: List[dict]) -> bytes:
+    """JSON for stored orders as FastAPI would render List[Order]."""
+    if FAST_JSON:
+        # Orders are written from Order models, so filling defaults is all validation would do
+        for order in orders:
+            for name, default in ORDER_FIELD_DEFAULTS.items():
+                order.setdefault(name, default)
+            for item in order.get("items", ()):
+                for name, default in ITEM_FIELD_DEFAULTS.items():
+                    item.setdefault(name, default)
+        return orjson.dumps(orders)
+    return order_list_adapter.dump_json(order_list_adapter.validate_python(orders))
+
+def json_page(body: bytes, response: Response) -> Response:
+    # Returning a Response skips FastAPI's response_model pass, the body is validated or projected already
+    return Response(content=body, media_type="application/json", headers=dict(response.headers))
+
+def orders_etag(request: Request, filters: dict, count: int, last_updated: Optional[datetime]) -> str:
+    # The query string covers pagination and projection, the filters the caller's view
+    key = json.dumps([request.url.query, filters, count, last_updated.isoformat() if last_updated else None], sort_keys=True)
+    return f'"{hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]}"'
+
+async def list_orders_with_archive(filters: dict, created, fields: Optional[List[str]], descending: bool,
+                                   limit: int, after) -> List[dict]:
+    """One page across the hot orders and the archive, merged in (created_at, id) order."""
+    hot, archived = await asyncio.gather(
+        storage.orders.list_page(filters, limit, after, fields, created, descending=descending),
+        storage.orders.list_page(filters, limit, after, fields, created, archived=True, descending=descending),
+    )
+    merged = {}
+    page_order = heapq.merge(hot, archived, key=lambda order: (order["created_at"], order["id"]), reverse=descending)
+    for order in page_order:
+        # An order caught mid-move exists in both collections
+        merged.setdefault(order["id"], order)
+    return list(merged.values())[:limit]
+
+async def find_orders_page(request: Request, filters: dict, response: Response, limit: Optional[int],
+                           after: Optional[str], fields: Optional[List[str]], created=None,
+                           descending: bool = False) -> Response:
+    # Read before the page, so a change landing in between costs one more full response, never a stale 304
+    count, last_updated = await storage.orders.change_marker(filters)
+    response.headers["ETag"] = orders_etag(request, filters, count, last_updated)
+    response.headers["Cache-Control"] = "private, no-cache"
+    if etag_matches(request.headers.get("if-none-match"), response.headers["ETag"]):
+        return Response(status_code=304, headers=dict(response.headers))
+    
+    if created is None:
+        list_page = partial(storage.orders.list_page, filters, fields=fields, descending=descending)
+    else:
+        list_page = partial(list_orders_with_archive, filters, created, fields, descending)
+    orders = await find_page(list_page, response, limit, after)
+    if fields is not None:
+        return json_page(dump_json(orders), response)
+    return json_page(dump_orders(orders), response)
+
+# Order Events
+class OrderSubscription:
+    """Event queue of one connected dashboard, filtered by what its user may see."""
+
+    def __init__(self, user: User, queue_size: int):
+        self.user = user
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.needs_resync = False
+
+    def wants(self, event: dict) -> bool:
+        order = event["order"]
+        if order_visible_to(self.user, order):
+            return True
+        # Still deliver the transition that takes an order out of this view
+        previous_status = event["previous_status"]
+        return previous_status is not None and order_visible_to(self.user, {**order, "status": previous_status})
+
+    def offer(self, event: dict):
+        if self.needs_resync or not self.wants(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client this far behind is cheaper to resync than to replay
+            self.needs_resync = True
+
+    def reset(self):
+        self.needs_resync = False
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+class OrderEventHub:
+    """Publishes order changes to subscribers and keeps recent events for resuming."""
+
+    def __init__(self, buffer_size: int, queue_size: int):
+        # Event ids carry the boot id, ids from another process or an earlier run force a resync
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.sequence = 0
+        self.queue_size = queue_size
+        self._buffer = deque(maxlen=buffer_size)
+        self._subscribers = set()
+
+    def publish(self, event_type: str, order: Order, previous_status: Optional[str] = None):
+        self.sequence += 1
+        event = {
+            "seq": self.sequence,
+            "type": event_type,
+            "previous_status": previous_status,
+            "order": jsonable_encoder(order),
+        }
+        self._buffer.append(event)
+        for subscription in self._subscribers:
+            subscription.offer(event)
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.boot_id}-{seq}"
+
+    def subscribe(self, user: User, last_event_id: Optional[str] = None) -> OrderSubscription:
+        subscription = OrderSubscription(user, self.queue_size)
+        if last_event_id is not None:
+            boot_id, _, seq = last_event_id.partition("-")
+            last_seq = int(seq) if boot_id == self.boot_id and seq.isdigit() else None
+            oldest_seq = self._buffer[0]["seq"] if self._buffer else self.sequence + 1
+            if last_seq is None or last_seq > self.sequence or last_seq < oldest_seq - 1:
+                # Issued by another process or run, or the gap fell out of the buffer
+                subscription.needs_resync = True
+            else:
+                for event in self._buffer:
+                    if event["seq"] > last_seq:
+                        subscription.offer(event)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: OrderSubscription):
+        self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+order_events = OrderEventHub(ORDER_EVENTS_BUFFER_SIZE, ORDER_EVENTS_QUEUE_SIZE)
+
+def format_order_event(subscription: OrderSubscription, event: dict) -> str:
+    data = {
+        "seq": event["seq"],
+        "type": event["type"],
+        "visible": order_visible_to(subscription.user, event["order"]),
+        "order": event["order"],
+    }
+    return f"id: {order_events.event_id(event['seq'])}\nevent: order\ndata: {json.dumps(data)}\n\n"
+
+async def run_idempotent(key: Optional[str], current_user: User, request_data: dict, operation):
+    """Runs operation once per Idempotency-Key of the user, repeats get the first response back."""
+    if key is None:
+        return await operation()
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key is longer than {IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+    
+    now = datetime.utcnow()
+    request_hash = hashlib.sha1(json.dumps(jsonable_encoder(request_data), sort_keys=True).encode("utf-8")).hexdigest()
+    existing = await storage.idempotency.claim({
+        "user_id": current_user.id,
+        "key": key,
+        "request_hash": request_hash,
+        "response": None,
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=IDEMPOTENCY_PENDING_SECONDS),
+    })
+    if existing is not None:
+        if existing["request_hash"] != request_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        if existing["response"] is None:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        return JSONResponse(content=existing["response"], headers={"Idempotent-Replayed": "true"})
+    
+    try:
+        result = await operation()
+    except Exception:
+        # Failed requests are not recorded, a retry runs again
+        await storage.idempotency.release(current_user.id, key)
+        raise
+    await storage.idempotency.complete(current_user.id, key, {
+        "response": jsonable_encoder(result),
+        "expires_at": now + timedelta(hours=IDEMPOTENCY_TTL_HOURS),
+    })
+    return result
+
 # Order Management Routes
 @api_router.post("/orders", response_model=Order)
-async def create_order(order_data: OrderCreate, current_user: User = Depends(get_current_user)):
+async def create_order(
+    order_data: OrderCreate,
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None),
+):
+    return await run_idempotent(
+        idempotency_key, current_user, {"create": order_data.dict()}, partial(place_order, order_data, current_user)
+    )
+
+async def place_order(order_data: OrderCreate, current_user: User) -> Order:
     if current_user.role != "serveur":
         raise HTTPException(status_code=403, detail="Only servers can create orders")
     
-    # Validate table number (1-8)
-    if order_data.table_number < 1 or order_data.table_number > 8:
-        raise HTTPException(status_code=400, detail="Table number must be between 1 and 8")
+    # Validate table number
+    if order_data.table_number < 1 or order_data.table_number > TABLE_COUNT:
+        raise HTTPException(status_code=400, detail=f"Table number must be between 1 and {TABLE_COUNT}")
     
-    # Calculate total amount
-    total_amount = sum(item.price * item.quantity for item in order_data.items)
+    items, total_amount = await price_order_items(order_data.items)
     
     order = Order(
         table_number=order_data.table_number,
         server_id=current_user.id,
         server_name=current_user.username,
-        items=order_data.items,
+        items=items,
         total_amount=total_amount,
         status="in_kitchen"
     )
     
-    await db.orders.insert_one(order.dict())
+    await storage.orders.insert(order.dict())
+    await refresh_table_state(order.table_number)
+    order_events.publish("created", order)
     return order
 
-@api_router.get("/orders", response_model=List[Order])
-async def get_orders(current_user: User = Depends(get_current_user)):
+@api_router.get("/orders", response_model=Union[List[Order], OrderDelta])
+async def get_orders(
+    request: Request,
+    response: Response,
+    since: Optional[datetime] = None,
+    after_id: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    newest_first: bool = False,
+    current_user: User = Depends(get_current_user),
+):
+    # Taken before reading so changes committed during the read are picked up next time
+    cursor = datetime.utcnow()
+    if since is not None:
+        # Deltas always carry full orders, clients merge them into their state
+        delta = await get_orders_delta(current_user, since, cursor, after_id)
+        return json_page(delta.model_dump_json().encode(), response)
+    
+    projection = parse_order_fields(fields, view)
+    created = None
+    if start is not None or end is not None:
+        # Date ranges also search the archive, which only admins may read
+        if current_user.role != "admin":
+            raise HTTPException(status_code=403, detail="Admin access required")
+        created = (to_utc_naive(start), to_utc_naive(end))
+    elif current_user.role == "admin":
+        # The admin list covers the whole history, archived orders included
+        created = (None, None)
+    
+    response.headers["X-Orders-Cursor"] = cursor.isoformat()
+    
     if current_user.role == "serveur":
         # Servers can only see their own orders
-        orders = await db.orders.find({"server_id": current_user.id}).to_list(1000)
+        filters = {"server_id": current_user.id}
     elif current_user.role == "chef":
         # Chefs see orders in kitchen and ready
-        orders = await db.orders.find({"status": {"$in": ["in_kitchen", "ready"]}}).to_list(1000)
+        filters = {"status": ROLE_ORDER_STATUSES["chef"]}
     elif current_user.role == "caisse":
         # Cashiers see ready and paid orders
-        orders = await db.orders.find({"status": {"$in": ["ready", "paid"]}}).to_list(1000)
+        filters = {"status": ROLE_ORDER_STATUSES["caisse"]}
     elif current_user.role == "admin":
         # Admin sees all orders
-        orders = await db.orders.find().to_list(1000)
+        filters = {}
     else:
-        orders = []
+        return []
     
-    return [Order(**order) for order in orders]
+    return await find_orders_page(request, filters, response, limit, after, projection, created, newest_first)
 
-@api_router.put("/orders/{order_id}")
-async def update_order(order_id: str, order_update: OrderUpdate, current_user: User = Depends(get_current_user)):
-    order = await db.orders.find_one({"id": order_id})
+async def get_orders_delta(current_user: User, since: datetime, cursor: datetime,
+                           after_id: Optional[str] = None) -> OrderDelta:
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    if after_id is None:
+        # The overlap absorbs writes stamped just before the previous read but committed after it
+        since -= timedelta(seconds=ORDERS_SYNC_OVERLAP_SECONDS)
+    # else the client continues a has_more page, going back again could return the same page forever
+    filters = {}
+    if current_user.role == "serveur":
+        filters["server_id"] = current_user.id
+    elif current_user.role in ROLE_ORDER_STATUSES:
+        # Visible statuses plus the later ones, whose orders become tombstones
+        visible_statuses = ROLE_ORDER_STATUSES[current_user.role]
+        last_visible = max(ORDER_STATUS_FLOW.index(s) for s in visible_statuses)
+        filters["status"] = visible_statuses + ORDER_STATUS_FLOW[last_visible + 1:]
+    elif current_user.role != "admin":
+        return OrderDelta(orders=[], removed=[], cursor=cursor)
+    
+    changed = await storage.orders.list_changed(filters, since, ORDERS_SYNC_MAX_CHANGES, after_id)
+    
+    has_more = len(changed) == ORDERS_SYNC_MAX_CHANGES
+    resume_id = None
+    if has_more:
+        # Resume right after the last change returned rather than skipping the rest
+        cursor = changed[-1]["updated_at"]
+        resume_id = changed[-1]["id"]
+    
+    return OrderDelta(
+        orders=[Order(**order) for order in changed if order_visible_to(current_user, order)],
+        removed=[order["id"] for order in changed if not order_visible_to(current_user, order)],
+        cursor=cursor,
+        has_more=has_more,
+        after_id=resume_id,
+    )
+
+async def explain_failed_order_update(order_id: str, order_update: OrderUpdate, current_user: User, conditions: dict,
+                                      order: Optional[dict] = None):
+    """Raises the error for the first update precondition the stored order does not meet."""
+    if order is None:
+        order = await storage.orders.get(order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    
+    if order_update.items is not None:
+        if order["server_id"] != current_user.id:
+            raise HTTPException(status_code=403, detail="Can only modify your own orders")
+        if order["status"] != conditions["status"]:
+            raise HTTPException(status_code=403, detail="Cannot modify order items")
+    elif order["status"] != conditions["status"]:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Order is {order['status']}, expected {conditions['status']}",
+        )
+
+@api_router.put("/orders/{order_id}")
+async def update_order(
+    order_id: str,
+    order_update: OrderUpdate,
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None),
+):
+    return await run_idempotent(
+        idempotency_key,
+        current_user,
+        {"update": order_id, **order_update.dict()},
+        partial(apply_order_update, order_id, order_update, current_user),
+    )
+
+async def apply_order_update(order_id: str, order_update: OrderUpdate, current_user: User) -> Order:
+    now = datetime.utcnow()
+    # Preconditions live in the filter so checking and writing is a single atomic round-trip
+    conditions = {"id": order_id}
     update_data = {}
     
     if order_update.items is not None:
         # Only servers can modify items and only if status is in_kitchen
-        if current_user.role != "serveur" or order["status"] not in ["in_kitchen"]:
+        if current_user.role != "serveur":
             raise HTTPException(status_code=403, detail="Cannot modify order items")
         
-        if order["server_id"] != current_user.id:
-            raise HTTPException(status_code=403, detail="Can only modify your own orders")
-        
-        total_amount = sum(item.price * item.quantity for item in order_update.items)
-        update_data["items"] = [item.dict() for item in order_update.items]
+        conditions["server_id"] = current_user.id
+        conditions["status"] = "in_kitchen"
+        # Not being allowed to edit the order at all takes precedence over bad items
+        stored = await storage.orders.get(order_id)
+        if stored is None or stored["server_id"] != current_user.id or stored["status"] != "in_kitchen":
+            await explain_failed_order_update(order_id, order_update, current_user, conditions, stored)
+        items, total_amount = await price_order_items(order_update.items, stored["items"])
+        # Line statuses come from this read, a kitchen update since then must not be overwritten
+        conditions["updated_at"] = stored["updated_at"]
+        update_data["items"] = [item.dict() for item in items]
         update_data["total_amount"] = total_amount
-        update_data["updated_at"] = datetime.utcnow()
+        update_data["updated_at"] = now
+        if order_update.version is not None:
+            conditions["version"] = version_condition(order_update.version)
     
     if order_update.status is not None:
-        if order_update.status == "ready" and current_user.role == "chef":
-            # Chef marking order as ready
-            update_data["status"] = "ready"
-            update_data["kitchen_ready_at"] = datetime.utcnow()
-            update_data["updated_at"] = datetime.utcnow()
-        elif order_update.status == "paid" and current_user.role == "caisse":
-            # Cashier marking order as paid
-            update_data["status"] = "paid"
-            update_data["paid_at"] = datetime.utcnow()
-            update_data["updated_at"] = datetime.utcnow()
-        else:
+        transition = ORDER_TRANSITIONS.get(order_update.status)
+        if transition is None or transition[0] != current_user.role:
             raise HTTPException(status_code=403, detail="Invalid status change")
+        
+        _, required_status, timestamp_field = transition
+        conditions["status"] = required_status
+        update_data["status"] = order_update.status
+        update_data[timestamp_field] = now
+        update_data["updated_at"] = now
+    
+    if not update_data:
+        order = await storage.orders.get(order_id)
+        if not order:
+            raise HTTPException(status_code=404, detail="Order not found")
+        return Order(**order)
+    
+    increments = {"version": 1} if "items" in update_data else None
+    updated = await storage.orders.update_if(conditions, update_data, increments)
+    
+    if updated is None:
+        await explain_failed_order_update(order_id, order_update, current_user, conditions)
+        # Preconditions hold again by now, the order changed under us
+        raise HTTPException(status_code=409, detail="Order changed concurrently, please retry")
+    
+    updated_order = Order(**updated)
+    if updated_order.status == "paid":
+        # The conditional update guarantees this runs once per order
+        await record_paid_order(updated_order)
+    await refresh_table_state(updated_order.table_number)
+    order_events.publish(update_data.get("status", "modified"), updated_order, previous_status=conditions["status"])
+    return updated_order
+
+@api_router.post("/orders/bulk-status", response_model=BulkStatusResponse)
+async def bulk_update_order_status(bulk_update: BulkStatusUpdate, current_user: User = Depends(get_current_user)):
+    transition = ORDER_TRANSITIONS.get(bulk_update.status)
+    if transition is None or transition[0] != current_user.role:
+        raise HTTPException(status_code=403, detail="Invalid status change")
+    
+    order_ids = list(dict.fromkeys(bulk_update.order_ids))
+    if not order_ids:
+        raise HTTPException(status_code=400, detail="No orders given")
+    if len(order_ids) > BULK_STATUS_MAX_ORDERS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_STATUS_MAX_ORDERS} orders per request")
+    
+    _, required_status, timestamp_field = transition
+    now = datetime.utcnow()
+    # One conditional write for all of them, orders not in the required status are left alone
+    stored, updated_ids = await storage.orders.update_many_if(
+        order_ids,
+        {"status": required_status},
+        {"status": bulk_update.status, timestamp_field: now, "updated_at": now},
+    )
+    
+    by_id = {order["id"]: order for order in stored}
+    results = []
+    updated_orders = []
+    for order_id in order_ids:
+        order = by_id.get(order_id)
+        if order is None:
+            results.append(BulkStatusResult(id=order_id, result="not_found"))
+        elif order_id in updated_ids:
+            updated_orders.append(Order(**order))
+            results.append(BulkStatusResult(id=order_id, result="updated", status=order["status"]))
+        else:
+            results.append(BulkStatusResult(id=order_id, result="conflict", status=order["status"]))
+    
+    if bulk_update.status == "paid":
+        await record_paid_orders(updated_orders)
+    for table_number in sorted({order.table_number for order in updated_orders}):
+        await refresh_table_state(table_number)
+    for order in updated_orders:
+        order_events.publish(bulk_update.status, order, previous_status=required_status)
+    return BulkStatusResponse(updated=len(updated_orders), results=results)
+
+@api_router.patch("/orders/{order_id}", response_model=Order)
+async def patch_order_items(order_id: str, order_patch: OrderPatch, current_user: User = Depends(get_current_user)):
+    if current_user.role != "serveur":
+        raise HTTPException(status_code=403, detail="Cannot modify order items")
+    if not order_patch.changes:
+        raise HTTPException(status_code=400, detail="No changes given")
+    
+    order = await storage.orders.get(order_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    if order["server_id"] != current_user.id:
+        raise HTTPException(status_code=403, detail="Can only modify your own orders")
+    if order["status"] != "in_kitchen":
+        raise HTTPException(status_code=403, detail="Cannot modify order items")
+    if order.get("version", 0) != order_patch.version:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Order was modified (version {order.get('version', 0)}), reload it and retry",
+        )
+    
+    patch, total_amount = await build_items_patch(order["items"], order_patch.changes)
+    # The version pins the lines the patch and total were computed from
+    conditions = {
+        "id": order_id,
+        "server_id": current_user.id,
+        "status": "in_kitchen",
+        "version": version_condition(order_patch.version),
+    }
+    if patch_rewrites_items(patch):
+        # Kitchen progress does not bump the version, the rewritten lines carry statuses from this read
+        conditions["updated_at"] = order["updated_at"]
+    updated = await storage.orders.patch_items_if(
+        conditions, patch, {"total_amount": total_amount, "updated_at": datetime.utcnow()}
+    )
+    
+    if updated is None:
+        raise HTTPException(status_code=409, detail="Order changed concurrently, please retry")
+    
+    updated_order = Order(**updated)
+    await refresh_table_state(updated_order.table_number)
+    order_events.publish("modified", updated_order, previous_status=updated_order.status)
+    return updated_order
+
+@api_router.put("/orders/{order_id}/items/{line_id}", response_model=Order)
+async def update_order_item_status(
+    order_id: str,
+    line_id: str,
+    item_update: ItemStatusUpdate,
+    current_user: User = Depends(get_current_user),
+):
+    if current_user.role not in ["admin", "chef"]:
+        raise HTTPException(status_code=403, detail="Admin or Chef access required")
+    if item_update.status not in ITEM_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid item status: {item_update.status}")
+    
+    # Sets the one line in place, the rest of the order is left as stored
+    conditions = {"id": order_id, "status": KITCHEN_PREP_STATUSES}
+    updated = await storage.orders.update_item_if(
+        conditions, line_id, {"status": item_update.status}, {"updated_at": datetime.utcnow()}
+    )
+    
+    if updated is None:
+        order = await storage.orders.get(order_id)
+        if not order:
+            raise HTTPException(status_code=404, detail="Order not found")
+        if not any(item.get("line_id") == line_id for item in order["items"]):
+            raise HTTPException(status_code=404, detail="Order item not found")
+        raise HTTPException(status_code=409, detail=f"Order is {order['status']}, items can no longer change")
+    
+    updated_order = Order(**updated)
+    order_events.publish("modified", updated_order, previous_status=updated_order.status)
+    return updated_order
+
+@api_router.post("/orders/events/ticket")
+async def create_order_events_ticket(current_user: User = Depends(get_current_user)):
+    # Ends up in URLs and access logs, so it only opens the stream and expires quickly
+    expires_at = datetime.utcnow() + timedelta(seconds=ORDER_EVENTS_TICKET_SECONDS)
+    claims = {"sub": current_user.id, "role": current_user.role, "username": current_user.username}
+    ticket = jwt.encode(
+        {**claims, "aud": ORDER_EVENTS_TICKET_AUDIENCE, "exp": expires_at}, JWT_SECRET, algorithm=JWT_ALGORITHM
+    )
+    return {"ticket": ticket, "expires_in": ORDER_EVENTS_TICKET_SECONDS}
+
+@api_router.get("/orders/events")
+async def stream_order_events(request: Request, ticket: Optional[str] = None, last_event_id: Optional[str] = None):
+    authorization = request.headers.get("authorization", "")
+    if ticket is not None:
+        current_user = await authenticate_token(ticket, audience=ORDER_EVENTS_TICKET_AUDIENCE)
+    elif authorization.lower().startswith("bearer "):
+        current_user = await authenticate_token(authorization[7:])
+    else:
+        raise credentials_exception("Not authenticated")
+    
+    # Browsers send Last-Event-ID on automatic reconnect
+    if last_event_id is None:
+        last_event_id = request.headers.get("last-event-id")
+    
+    subscription = order_events.subscribe(current_user, last_event_id)
     
-    if update_data:
-        await db.orders.update_one({"id": order_id}, {"$set": update_data})
+    async def event_stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                if subscription.needs_resync:
+                    subscription.reset()
+                    message = f"id: {order_events.event_id(order_events.sequence)}\nevent: resync\ndata: {{}}\n\n"
+                else:
+                    try:
+                        event = await asyncio.wait_for(subscription.queue.get(), ORDER_EVENTS_KEEPALIVE_SECONDS)
+                        message = format_order_event(subscription, event)
+                    except asyncio.TimeoutError:
+                        message = ": keepalive\n\n"
+                # A deleted user stops receiving orders now, not when the connection drops
+                await user_cache.sync_revocations()
+                if user_cache.is_revoked(current_user.id):
+                    return
+                yield message
+        finally:
+            order_events.unsubscribe(subscription)
     
-    updated_order = await db.orders.find_one({"id": order_id})
-    return Order(**updated_order)
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @api_router.get("/orders/table/{table_number}")
-async def get_table_orders(table_number: int, current_user: User = Depends(get_current_user)):
-    if table_number < 1 or table_number > 8:
-        raise HTTPException(status_code=400, detail="Table number must be between 1 and 8")
+async def get_table_orders(
+    table_number: int,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+):
+    if table_number < 1 or table_number > TABLE_COUNT:
+        raise HTTPException(status_code=400, detail=f"Table number must be between 1 and {TABLE_COUNT}")
+    
+    projection = parse_order_fields(fields, view)
+    return await find_orders_page(request, {"table_number": table_number}, response, limit, after, projection)
+
+# Table States
+def build_table_state(table_number: int, orders: List[dict], computed_at: datetime) -> dict:
+    open_orders = [TableOrder(**order) for order in orders]
+    status = "free"
+    for order_status in OPEN_ORDER_STATUSES:
+        if any(order.status == order_status for order in open_orders):
+            status = order_status
+    
+    return TableState(
+        table_number=table_number,
+        status=status,
+        open_orders=open_orders,
+        running_total=sum(to_millimes(order.total_amount) for order in open_orders) / 1000,
+        oldest_open_at=min((order.created_at for order in open_orders), default=None),
+        computed_at=computed_at,
+    ).dict()
+
+async def refresh_table_state(table_number: int):
+    """Recomputes the state of one table from its open orders."""
+    # Stamped before the read, so a state computed from older data can never overwrite a newer one
+    computed_at = datetime.utcnow()
+    orders = await storage.orders.list_page(
+        {"table_number": table_number, "status": OPEN_ORDER_STATUSES},
+        PAGE_SIZE_MAX,
+        fields=list(TableOrder.model_fields),
+    )
+    await storage.tables.replace_if_newer(build_table_state(table_number, orders, computed_at))
+
+async def refresh_all_table_states():
+    await asyncio.gather(*(refresh_table_state(n) for n in range(1, TABLE_COUNT + 1)))
+
+@api_router.get("/tables", response_model=List[TableState])
+async def get_tables(current_user: User = Depends(get_current_user)):
+    states = {state["table_number"]: state for state in await storage.tables.list_all()}
+    floor = [states.get(n) or TableState(table_number=n).dict() for n in range(1, TABLE_COUNT + 1)]
+    return Response(content=dump_json(floor), media_type="application/json")
+
+# Kitchen Routes
+@api_router.get("/kitchen/queue", response_model=KitchenQueue)
+async def get_kitchen_queue(current_user: User = Depends(get_current_user)):
+    if current_user.role not in ["admin", "chef"]:
+        raise HTTPException(status_code=403, detail="Admin or Chef access required")
+    
+    queue = KitchenQueue(**await storage.orders.kitchen_queue(
+        "in_kitchen", KITCHEN_QUEUE_LIMIT, KITCHEN_PREP_STATUSES
+    ))
+    return Response(content=queue.model_dump_json(), media_type="application/json")
+
+# Statistics Routes
+def to_utc_naive(moment: Optional[datetime]) -> Optional[datetime]:
+    # Stored timestamps are naive UTC, naive input is taken as UTC too
+    if moment is None or moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+def stats_response(start: Optional[datetime], end: Optional[datetime], orders_by_status: dict, paid: dict) -> dict:
+    revenue = paid["revenue"]
+    paid_orders = paid["orders"]
+    return {
+        "start": start,
+        "end": end,
+        "timezone": STATS_TIMEZONE,
+        "total_orders": sum(orders_by_status.values()),
+        "orders_by_status": orders_by_status,
+        "revenue": round(revenue, 3),
+        "paid_orders": paid_orders,
+        "average_ticket": round(revenue / paid_orders, 3) if paid_orders else 0.0,
+        "revenue_by_day": [{**row, "revenue": round(row["revenue"], 3)} for row in paid["by_day"]],
+        "revenue_by_hour": [{**row, "revenue": round(row["revenue"], 3)} for row in paid["by_hour"]],
+        "top_items": [{**row, "revenue": round(row["revenue"], 3)} for row in paid["top_items"]],
+        "servers": [{**row, "revenue": round(row["revenue"], 3)} for row in paid["servers"]],
+    }
+
+async def compute_stats_from_orders(start: Optional[datetime], end: Optional[datetime]) -> dict:
+    """Exact statistics aggregated from the raw orders."""
+    bounds = (to_utc_naive(start), to_utc_naive(end))
+    orders_by_status, paid = await asyncio.gather(
+        storage.orders.count_by_status(bounds),
+        storage.orders.paid_breakdown(bounds, STATS_TIMEZONE, STATS_TOP_ITEMS),
+    )
+    return stats_response(start, end, orders_by_status, paid)
+
+def local_day(moment: datetime) -> str:
+    return moment.replace(tzinfo=timezone.utc).astimezone(STATS_TZ).date().isoformat()
+
+def add_to_path(doc: dict, path: str, value, increment: bool = True):
+    *parents, leaf = path.split(".")
+    for key in parents:
+        doc = doc.setdefault(key, {})
+    doc[leaf] = doc.get(leaf, 0) + value if increment else value
+
+def paid_order_rollup(order: Order):
+    """Day, increments and names a paid order contributes to its daily_stats document.
+    
+    Amounts are whole millimes, so months of increments add up exactly.
+    """
+    paid_at = order.paid_at or order.updated_at
+    hour = paid_at.replace(tzinfo=timezone.utc).astimezone(STATS_TZ).hour
+    total_millimes = to_millimes(order.total_amount)
+    increments = {"revenue_millimes": total_millimes, "orders": 1, "items_sold": 0}
+    names = {f"servers.{order.server_id}.name": order.server_name}
+    
+    for key, value in [("revenue_millimes", total_millimes), ("orders", 1)]:
+        increments[f"hours.{hour}.{key}"] = value
+        increments[f"servers.{order.server_id}.{key}"] = value
+    for item in order.items:
+        line_millimes = to_millimes(item.price) * item.quantity
+        increments["items_sold"] += item.quantity
+        for key, value in [("quantity", item.quantity), ("revenue_millimes", line_millimes)]:
+            path = f"items.{item.menu_item_id}.{key}"
+            increments[path] = increments.get(path, 0) + value
+        names[f"items.{item.menu_item_id}.name"] = item.menu_item_name
+    
+    return local_day(paid_at), increments, names
+
+async def record_paid_order(order: Order):
+    await record_paid_orders([order])
+
+async def record_paid_orders(orders: List[Order]):
+    """Adds paid orders to their daily_stats documents, one write per day."""
+    days = {}
+    for order in orders:
+        day, increments, names = paid_order_rollup(order)
+        day_increments, day_names = days.setdefault(day, ({}, {}))
+        for path, value in increments.items():
+            day_increments[path] = day_increments.get(path, 0) + value
+        day_names.update(names)
+    
+    for day, (increments, names) in days.items():
+        await storage.daily_stats.increment(day, increments, {**names, "updated_at": datetime.utcnow()})
+
+@asynccontextmanager
+async def maintenance_lock(name: str):
+    """Yields whether this process got the lock, held across workers for MAINTENANCE_LOCK_SECONDS at most."""
+    owner = str(uuid.uuid4())
+    now = datetime.utcnow()
+    acquired = await storage.locks.acquire(name, owner, now + timedelta(seconds=MAINTENANCE_LOCK_SECONDS), now)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            await storage.locks.release(name, owner)
+
+async def rebuild_daily_stats() -> int:
+    """Regenerates the daily_stats documents of past days from the paid orders, returns the number of days.
+    
+    Today's document is left to the payments still being recorded into it, so this is safe during
+    service. Callers hold the "daily_stats" maintenance lock.
+    """
+    today = local_day(datetime.utcnow())
+    days = {}
+    async for doc in storage.orders.iter_by_status("paid"):
+        day, increments, names = paid_order_rollup(Order(**doc))
+        if day >= today:
+            continue
+        rollup = days.setdefault(day, {"date": day, "updated_at": datetime.utcnow()})
+        for path, value in increments.items():
+            add_to_path(rollup, path, value)
+        for path, value in names.items():
+            add_to_path(rollup, path, value, increment=False)
+    
+    await storage.daily_stats.replace_days(list(days.values()), before=today)
+    return len(days)
+
+async def seed_daily_stats() -> int:
+    """Fills an empty daily_stats from the paid orders, returns how many orders were added.
+    
+    Adds with the same increments as payments, so payments recorded meanwhile are kept.
+    Callers hold the "daily_stats" maintenance lock.
+    """
+    # Orders paid from here on are recorded by their payment
+    paid_before = datetime.utcnow()
+    if not await storage.daily_stats.is_empty():
+        return 0
+    
+    seeded = 0
+    batch = []
+    async for doc in storage.orders.iter_by_status("paid"):
+        order = Order(**doc)
+        if (order.paid_at or order.updated_at) >= paid_before:
+            continue
+        batch.append(order)
+        if len(batch) == DAILY_STATS_SEED_BATCH_SIZE:
+            await record_paid_orders(batch)
+            seeded += len(batch)
+            batch = []
+    await record_paid_orders(batch)
+    return seeded + len(batch)
+
+async def compute_stats_from_rollups(start: Optional[datetime], end: Optional[datetime]) -> dict:
+    """Statistics read from daily_stats, the range is rounded to whole local days."""
+    start_day = local_day(to_utc_naive(start)) if start else None
+    end_day = local_day(to_utc_naive(end)) if end else None
+    unpaid_statuses = [s for s in ORDER_STATUS_FLOW if s != "paid"]
+    rollups, orders_by_status = await asyncio.gather(
+        storage.daily_stats.list_days(start_day, end_day),
+        storage.orders.count_by_status((to_utc_naive(start), to_utc_naive(end)), unpaid_statuses),
+    )
+    
+    merged = {}
+    for rollup in rollups:
+        for path in ["revenue_millimes", "orders"]:
+            add_to_path(merged, path, rollup.get(path, 0))
+        for section in ["hours", "items", "servers"]:
+            for key, values in rollup.get(section, {}).items():
+                for field, value in values.items():
+                    add_to_path(merged, f"{section}.{key}.{field}", value, increment=field != "name")
+    
+    paid_orders = merged.get("orders", 0)
+    if paid_orders:
+        orders_by_status["paid"] = paid_orders
+    items = sorted(merged.get("items", {}).items(), key=lambda entry: (-entry[1]["quantity"], entry[0]))
+    servers = sorted(merged.get("servers", {}).items(), key=lambda entry: -entry[1]["revenue_millimes"])
+    hours = sorted(merged.get("hours", {}).items(), key=lambda entry: int(entry[0]))
+    
+    def tnd(values: dict) -> float:
+        return values.get("revenue_millimes", 0) / 1000
+    
+    paid = {
+        "revenue": tnd(merged),
+        "orders": paid_orders,
+        "by_day": [{"date": rollup["date"], "revenue": tnd(rollup), "orders": rollup["orders"]} for rollup in rollups],
+        "by_hour": [{"hour": int(hour), "revenue": tnd(values), "orders": values["orders"]} for hour, values in hours],
+        "top_items": [
+            {"menu_item_id": item_id, "name": values["name"], "quantity": values["quantity"], "revenue": tnd(values)}
+            for item_id, values in items[:STATS_TOP_ITEMS]
+        ],
+        "servers": [
+            {"server_id": server_id, "server_name": values["name"], "revenue": tnd(values), "orders": values["orders"]}
+            for server_id, values in servers
+        ],
+    }
+    return stats_response(start, end, orders_by_status, paid)
+
+@api_router.get("/stats")
+async def get_stats(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    source: str = "rollup",
+    current_user: User = Depends(get_current_user),
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
     
-    orders = await db.orders.find({"table_number": table_number}).to_list(1000)
-    return [Order(**order) for order in orders]
+    if source == "rollup":
+        return await compute_stats_from_rollups(start, end)
+    if source == "orders":
+        return await compute_stats_from_orders(start, end)
+    raise HTTPException(status_code=400, detail="source must be rollup or orders")
+
+@api_router.post("/stats/rebuild")
+async def rebuild_stats(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    async with maintenance_lock("daily_stats") as acquired:
+        if not acquired:
+            raise HTTPException(status_code=409, detail="Daily statistics are already being rebuilt")
+        days = await rebuild_daily_stats()
+    return {"message": f"Daily statistics rebuilt for {days} days"}
+
+@api_router.get("/system/indexes")
+async def get_index_status(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return index_status
 
 # Initialize default admin user
 @api_router.post("/init")
 async def initialize_system():
     # Check if admin already exists
-    admin = await db.users.find_one({"role": "admin"})
+    admin = await storage.users.get_by_role("admin")
     if admin:
         return {"message": "System already initialized"}
     
     # Create default admin user
     admin_user = User(
         username="admin",
-        password_hash=hash_password("admin123"),
+        password_hash=await hash_password_async("admin123"),
         role="admin"
     )
     
-    await db.users.insert_one(admin_user.dict())
+    await storage.users.insert(admin_user.dict())
     
     # Create some sample menu items
     sample_menu = [
@@ -366,7 +1789,8 @@ async def initialize_system():
     
     for item in sample_menu:
         menu_item = MenuItem(**item)
-        await db.menu_items.insert_one(menu_item.dict())
+        await storage.menu.insert(menu_item.dict())
+    menu_cache.invalidate()
     
     return {"message": "System initialized with admin user (admin/admin123) and sample menu"}
 
@@ -379,8 +1803,24 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Orders-Cursor", "X-Next-Cursor", "ETag", "Idempotent-Replayed"],
+)
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+app.add_middleware(
+    RequestMetricsMiddleware,
+    requests=REQUEST_SECONDS,
+    in_flight=REQUESTS_IN_FLIGHT,
+    slow_requests=SLOW_REQUESTS,
+    slow_seconds=SLOW_REQUEST_MS / 1000,
 )
 
+# Served outside /api so scrapers can reach it without going through the ingress
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -388,6 +1828,105 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Result of the last index check, reported by GET /api/system/indexes
+index_status = []
+
+@app.on_event("startup")
+async def ensure_indexes():
+    index_status[:] = await storage.ensure_indexes()
+    for entry in index_status:
+        if entry["status"] != "failed":
+            continue
+        if entry["unique"]:
+            # Lookups by id/username assume uniqueness, refuse to serve without it
+            logger.error(f"Cannot create unique index on {entry['collection']} {entry['keys']}: {entry['error']}")
+            raise RuntimeError(f"Unique index on {entry['collection']} {entry['keys']} could not be created")
+        logger.warning(f"Cannot create index on {entry['collection']} {entry['keys']}: {entry['error']}")
+    
+    logger.info(f"Ensured {len(index_status)} indexes")
+
+def record_event_loop_lag(lag: float):
+    EVENT_LOOP_LAG_SECONDS.observe(lag)
+    EVENT_LOOP_LAG_LAST.set(lag)
+
+event_loop_watchdog = EventLoopWatchdog(
+    EVENT_LOOP_LAG_INTERVAL_SECONDS,
+    EVENT_LOOP_BLOCK_THRESHOLD_SECONDS,
+    on_lag=record_event_loop_lag,
+    on_block=EVENT_LOOP_BLOCKED.inc,
+    logger=logging.getLogger("watchdog"),
+)
+
+@app.on_event("startup")
+async def start_event_loop_watchdog():
+    if EVENT_LOOP_LAG_INTERVAL_SECONDS > 0:
+        event_loop_watchdog.start()
+
+async def archive_paid_orders() -> int:
+    """Moves paid orders older than ORDERS_ARCHIVE_AFTER_HOURS to the archive, returns how many."""
+    paid_before = datetime.utcnow() - timedelta(hours=ORDERS_ARCHIVE_AFTER_HOURS)
+    archived = 0
+    while True:
+        moved = await storage.orders.archive_paid(paid_before, ORDERS_ARCHIVE_BATCH_SIZE)
+        archived += moved
+        if moved < ORDERS_ARCHIVE_BATCH_SIZE:
+            return archived
+
+async def run_order_archiver():
+    while True:
+        try:
+            archived = await archive_paid_orders()
+            if archived:
+                logger.info(f"Archived {archived} paid orders")
+        except Exception:
+            logger.exception("Order archiving failed")
+        await asyncio.sleep(ORDERS_ARCHIVE_INTERVAL_SECONDS)
+
+background_tasks = []
+
+@app.on_event("startup")
+async def rebuild_table_states():
+    # States may be missing or stale after a restart or a change of TABLE_COUNT
+    await refresh_all_table_states()
+
+@app.on_event("startup")
+async def seed_daily_stats_on_startup():
+    # A database that predates the rollups would report no revenue for its history,
+    # the first worker to start fills it in
+    async with maintenance_lock("daily_stats") as acquired:
+        if acquired:
+            seeded = await seed_daily_stats()
+            if seeded:
+                logger.info(f"Seeded daily statistics with {seeded} paid orders")
+
+@app.on_event("startup")
+async def start_order_archiver():
+    if ORDERS_ARCHIVE_AFTER_HOURS > 0 and ORDERS_ARCHIVE_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(run_order_archiver()))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    event_loop_watchdog.stop()
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    storage.close()
+    password_pool.shutdown()
+
+if __name__ == "__main__":
+    import sys
+    
+    async def rebuild_daily_stats_locked() -> Optional[int]:
+        async with maintenance_lock("daily_stats") as acquired:
+            return await rebuild_daily_stats() if acquired else None
+    
+    if sys.argv[1:] == ["rebuild-daily-stats"]:
+        rebuilt_days = asyncio.run(rebuild_daily_stats_locked())
+        if rebuilt_days is None:
+            sys.exit("Daily statistics are already being rebuilt")
+        print(f"Daily statistics rebuilt for {rebuilt_days} days")
+    elif sys.argv[1:] == ["archive-orders"]:
+        archived_orders = asyncio.run(archive_paid_orders())
+        print(f"Archived {archived_orders} paid orders")
+    else:
+        print("Usage: python server.py rebuild-daily-stats | archive-orders")
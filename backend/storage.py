@@ -0,0 +1,1135 @@
+"""Storage backends for users, menu items, orders and daily statistics.
+
+Handlers in server.py only talk to the repositories below, so the same app can
+run against MongoDB (Motor) or entirely in memory for tests and benchmarks.
+Repositories exchange plain documents (dicts); building models is the caller's job.
+
+Filters are dicts of field -> value, where a list value means "any of".
+"""
+
+import asyncio
+import bisect
+import copy
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError as MongoDuplicateKeyError, PyMongoError
+
+# Position in the keyset order of paginated lists: (created_at, id)
+PageKey = Tuple[datetime, str]
+# Half-open [start, end) range of naive UTC datetimes, either side may be None
+DateRange = Tuple[Optional[datetime], Optional[datetime]]
+
+# Indexes ensured at startup: (collection, keys, unique)
+REQUIRED_INDEXES = [
+    ("users", [("id", 1)], True),
+    ("users", [("username", 1)], True),
+    ("menu_items", [("id", 1)], True),
+    ("menu_items", [("created_at", 1), ("id", 1)], False),
+    ("orders", [("id", 1)], True),
+    ("orders", [("created_at", 1), ("id", 1)], False),
+    # Filtered lists page on (created_at, id), the trailing id keeps their keyset scans on the index
+    ("orders", [("status", 1), ("created_at", 1), ("id", 1)], False),
+    ("orders", [("server_id", 1), ("created_at", 1), ("id", 1)], False),
+    ("orders", [("table_number", 1), ("created_at", 1), ("id", 1)], False),
+    ("orders", [("updated_at", 1), ("id", 1)], False),
+    # Latest change of a role's orders, read by change_marker() for list ETags
+    ("orders", [("status", 1), ("updated_at", 1)], False),
+    ("orders", [("server_id", 1), ("updated_at", 1)], False),
+    ("orders", [("status", 1), ("paid_at", 1)], False),
+    ("orders_archive", [("id", 1)], True),
+    ("orders_archive", [("created_at", 1), ("id", 1)], False),
+    ("orders_archive", [("paid_at", 1)], False),
+    ("daily_stats", [("date", 1)], True),
+    ("table_states", [("table_number", 1)], True),
+    ("idempotency_keys", [("user_id", 1), ("key", 1)], True),
+    ("revoked_users", [("user_id", 1)], True),
+    ("locks", [("name", 1)], True),
+]
+
+# Indexes superseded by REQUIRED_INDEXES, dropped at startup where they still exist
+RETIRED_INDEXES = [
+    ("orders", [("status", 1), ("created_at", 1)]),
+    ("orders", [("server_id", 1), ("created_at", 1)]),
+    ("orders", [("table_number", 1), ("status", 1)]),
+]
+
+# Documents MongoDB removes by itself once the time in the field has passed
+EXPIRING_INDEXES = [
+    ("idempotency_keys", "expires_at"),
+    ("revoked_users", "expires_at"),
+    ("locks", "expires_at"),
+]
+
+
+def index_specs() -> List[Tuple[str, list, bool, dict]]:
+    """(collection, keys, unique, options) of REQUIRED_INDEXES and the TTL indexes of EXPIRING_INDEXES."""
+    return [(collection, keys, unique, {}) for collection, keys, unique in REQUIRED_INDEXES] + [
+        (collection, [(field, 1)], False, {"expireAfterSeconds": 0}) for collection, field in EXPIRING_INDEXES
+    ]
+
+
+class DuplicateKeyError(Exception):
+    """Raised when an insert would break a unique index."""
+
+
+class UsersRepository:
+    async def get(self, user_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def get_by_username(self, username: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def get_by_role(self, role: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def insert(self, user: dict):
+        raise NotImplementedError
+
+    async def delete(self, user_id: str) -> bool:
+        raise NotImplementedError
+
+    async def list_page(self, limit: int, after: Optional[PageKey] = None) -> List[dict]:
+        raise NotImplementedError
+
+
+class MenuRepository:
+    async def list_all(self) -> List[dict]:
+        """Every menu item in (created_at, id) order."""
+        raise NotImplementedError
+
+    async def insert(self, item: dict):
+        raise NotImplementedError
+
+    async def update(self, item_id: str, fields: dict) -> bool:
+        """True when the item exists and at least one field changed."""
+        raise NotImplementedError
+
+    async def delete(self, item_id: str) -> bool:
+        raise NotImplementedError
+
+
+class OrdersRepository:
+    async def insert(self, order: dict):
+        raise NotImplementedError
+
+    async def get(self, order_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def list_page(self, filters: dict, limit: int, after: Optional[PageKey] = None,
+                        fields: Optional[List[str]] = None, created: Optional[DateRange] = None,
+                        archived: bool = False, descending: bool = False) -> List[dict]:
+        """A page of orders, from the archive when `archived`; `fields` restricts the returned keys.
+
+        Newest first when `descending`, `after` is then the last key of the previous page too.
+        """
+        raise NotImplementedError
+
+    async def list_changed(self, filters: dict, since: datetime, limit: int, after_id: Optional[str] = None) -> List[dict]:
+        """Orders with updated_at >= since in (updated_at, id) order, oldest change first.
+
+        With after_id, only orders strictly after (since, after_id) in that order.
+        """
+        raise NotImplementedError
+
+    async def change_marker(self, filters: dict) -> Tuple[int, Optional[datetime]]:
+        """Count and latest updated_at of the matching orders, changes whenever the set does."""
+        raise NotImplementedError
+
+    async def update_if(self, conditions: dict, fields: dict, increments: Optional[dict] = None) -> Optional[dict]:
+        """Atomically sets fields (and adds increments) on the order matching conditions.
+
+        Returns the order updated, or None when nothing matched.
+        """
+        raise NotImplementedError
+
+    async def update_many_if(self, ids: List[str], conditions: dict, fields: dict) -> Tuple[List[dict], set]:
+        """Sets fields on those of the orders matching conditions in one write.
+
+        Returns every order of ids that exists, as stored after the write, and the ids of
+        those this write updated.
+        """
+        raise NotImplementedError
+
+    async def patch_items_if(self, conditions: dict, patch: dict, fields: dict) -> Optional[dict]:
+        """Applies an item diff to the order matching conditions and bumps its version.
+
+        patch holds "add" (new lines), "remove" (line ids), "quantity" ({line_id: delta}, lines
+        gaining portions go back to "queued") and "items", the list the diff results in.
+        A diff for which patch_rewrites_items() is true stores "items" as a whole.
+        Returns the order updated or None.
+        """
+        raise NotImplementedError
+
+    async def update_item_if(self, conditions: dict, line_id: str, item_fields: dict, fields: dict) -> Optional[dict]:
+        """Like update_if, also setting item_fields on the order's item with line_id.
+
+        Returns None when the order does not match or has no such item.
+        """
+        raise NotImplementedError
+
+    async def archive_paid(self, paid_before: datetime, limit: int) -> int:
+        """Moves up to `limit` orders paid before `paid_before` to the archive, returns how many."""
+        raise NotImplementedError
+
+    def iter_by_status(self, status: str) -> AsyncIterator[dict]:
+        """Orders with the status, archived ones included."""
+        raise NotImplementedError
+
+    async def kitchen_queue(self, status: str, limit: int, prep_statuses: List[str]) -> dict:
+        """The oldest `limit` orders with `status`, and what orders in `prep_statuses` still need prepared.
+
+        Returns {"orders": [...], "to_prepare": [...]}, to_prepare holding one row per menu
+        item (menu_item_id, name, quantity, cooking, orders, oldest_at) over the lines not done
+        yet, largest quantity first.
+        """
+        raise NotImplementedError
+
+    async def count_by_status(self, created: DateRange, statuses: Optional[List[str]] = None) -> Dict[str, int]:
+        """Orders per status, archived ones included."""
+        raise NotImplementedError
+
+    async def paid_breakdown(self, paid: DateRange, timezone: str, top_items: int) -> dict:
+        """Totals, by_day, by_hour, top_items and servers of paid orders, days and hours in timezone.
+
+        Archived orders are included.
+        """
+        raise NotImplementedError
+
+
+class DailyStatsRepository:
+    async def increment(self, day: str, increments: dict, fields: dict):
+        """Upserts the day, adding increments and setting fields (both keyed by dotted paths)."""
+        raise NotImplementedError
+
+    async def replace_days(self, days: List[dict], before: str):
+        """Stores each of days as a whole and drops the other days earlier than `before`.
+
+        Days from `before` on that are not in days are left untouched.
+        """
+        raise NotImplementedError
+
+    async def is_empty(self) -> bool:
+        raise NotImplementedError
+
+    async def list_days(self, start_day: Optional[str], end_day: Optional[str]) -> List[dict]:
+        """Days in [start_day, end_day) in date order."""
+        raise NotImplementedError
+
+
+class TableStatesRepository:
+    async def replace_if_newer(self, state: dict) -> bool:
+        """Stores the state of state["table_number"] unless one computed later is already stored."""
+        raise NotImplementedError
+
+    async def list_all(self) -> List[dict]:
+        """Stored table states by table number."""
+        raise NotImplementedError
+
+
+class IdempotencyRepository:
+    async def claim(self, record: dict) -> Optional[dict]:
+        """Stores record for its (user_id, key) and returns None.
+
+        If an unexpired record holds the key already, nothing is stored and that record is returned.
+        """
+        raise NotImplementedError
+
+    async def complete(self, user_id: str, key: str, fields: dict):
+        raise NotImplementedError
+
+    async def release(self, user_id: str, key: str):
+        raise NotImplementedError
+
+
+class RevokedUsersRepository:
+    async def add(self, user_id: str, expires_at: datetime):
+        """Records that tokens of user_id are refused until expires_at."""
+        raise NotImplementedError
+
+    async def list_active(self, now: datetime) -> List[dict]:
+        """Revocations (user_id, expires_at) still in force at now."""
+        raise NotImplementedError
+
+
+class LocksRepository:
+    async def acquire(self, name: str, owner: str, expires_at: datetime, now: datetime) -> bool:
+        """Takes the lock `name` for owner until expires_at, False while someone else holds it."""
+        raise NotImplementedError
+
+    async def release(self, name: str, owner: str):
+        raise NotImplementedError
+
+
+class Storage:
+    users: UsersRepository
+    menu: MenuRepository
+    orders: OrdersRepository
+    daily_stats: DailyStatsRepository
+    tables: TableStatesRepository
+    idempotency: IdempotencyRepository
+    revoked_users: RevokedUsersRepository
+    locks: LocksRepository
+
+    async def ensure_indexes(self) -> List[dict]:
+        """Creates the indexes of index_specs(), returns one status entry per index."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def patch_rewrites_items(patch: dict) -> bool:
+    """True when an item diff mixes kinds and is stored by rewriting the whole items list.
+
+    Such a write also overwrites line statuses, so it has to be guarded by the order's updated_at.
+    """
+    return sum(1 for kind in ("add", "remove", "quantity") if patch[kind]) > 1
+
+
+# MongoDB
+def mongo_filter(filters: dict) -> dict:
+    return {key: {"$in": value} if isinstance(value, list) else value for key, value in filters.items()}
+
+
+def mongo_range(field: str, bounds: DateRange) -> dict:
+    start, end = bounds
+    condition = {}
+    if start is not None:
+        condition["$gte"] = start
+    if end is not None:
+        condition["$lt"] = end
+    return {field: condition} if condition else {}
+
+
+def mongo_after(after: Optional[PageKey], descending: bool = False) -> dict:
+    if after is None:
+        return {}
+    created_at, item_id = after
+    past = "$lt" if descending else "$gt"
+    return {"$or": [
+        {"created_at": {past: created_at}},
+        {"created_at": created_at, "id": {past: item_id}},
+    ]}
+
+
+def mongo_projection(fields: Optional[List[str]]) -> dict:
+    projection = {"_id": 0}
+    for field in fields or []:
+        projection[field] = 1
+    return projection
+
+
+# Keyset order shared by every paginated list, id breaks created_at ties
+PAGE_SORT = [("created_at", 1), ("id", 1)]
+# The same index read backwards, for newest-first lists
+PAGE_SORT_DESC = [("created_at", -1), ("id", -1)]
+
+
+class MongoUsersRepository(UsersRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, user_id):
+        return await self.collection.find_one({"id": user_id})
+
+    async def get_by_username(self, username):
+        return await self.collection.find_one({"username": username})
+
+    async def get_by_role(self, role):
+        return await self.collection.find_one({"role": role})
+
+    async def insert(self, user):
+        try:
+            await self.collection.insert_one(dict(user))
+        except MongoDuplicateKeyError as e:
+            raise DuplicateKeyError(str(e))
+
+    async def delete(self, user_id):
+        result = await self.collection.delete_one({"id": user_id})
+        return result.deleted_count > 0
+
+    async def list_page(self, limit, after=None):
+        return await self.collection.find(mongo_after(after)).sort(PAGE_SORT).limit(limit).to_list(limit)
+
+
+class MongoMenuRepository(MenuRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def list_all(self):
+        return await self.collection.find().sort(PAGE_SORT).to_list(None)
+
+    async def insert(self, item):
+        await self.collection.insert_one(dict(item))
+
+    async def update(self, item_id, fields):
+        result = await self.collection.update_one({"id": item_id}, {"$set": fields})
+        return result.modified_count > 0
+
+    async def delete(self, item_id):
+        result = await self.collection.delete_one({"id": item_id})
+        return result.deleted_count > 0
+
+
+class MongoOrdersRepository(OrdersRepository):
+    def __init__(self, collection, archive):
+        self.collection = collection
+        self.archive = archive
+
+    async def insert(self, order):
+        await self.collection.insert_one(dict(order))
+
+    async def get(self, order_id):
+        return await self.collection.find_one({"id": order_id})
+
+    async def list_page(self, filters, limit, after=None, fields=None, created=None, archived=False, descending=False):
+        query = {
+            **mongo_filter(filters),
+            **mongo_range("created_at", created or (None, None)),
+            **mongo_after(after, descending),
+        }
+        collection = self.archive if archived else self.collection
+        cursor = collection.find(query, mongo_projection(fields))
+        return await cursor.sort(PAGE_SORT_DESC if descending else PAGE_SORT).limit(limit).to_list(limit)
+
+    async def list_changed(self, filters, since, limit, after_id=None):
+        query = mongo_filter(filters)
+        if after_id is None:
+            query["updated_at"] = {"$gte": since}
+        else:
+            query["$or"] = [{"updated_at": {"$gt": since}}, {"updated_at": since, "id": {"$gt": after_id}}]
+        cursor = self.collection.find(query).sort([("updated_at", 1), ("id", 1)])
+        return await cursor.limit(limit).to_list(limit)
+
+    async def change_marker(self, filters):
+        # Two reads served by indexes instead of a $group over every matching order
+        query = mongo_filter(filters)
+        count = await self.collection.count_documents(query)
+        latest = await self.collection.find(query, {"_id": 0, "updated_at": 1}).sort("updated_at", -1).limit(1).to_list(1)
+        return count, latest[0]["updated_at"] if latest else None
+
+    async def update_if(self, conditions, fields, increments=None):
+        update = {"$set": fields}
+        if increments:
+            update["$inc"] = increments
+        return await self.collection.find_one_and_update(
+            mongo_filter(conditions),
+            update,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def update_many_if(self, ids, conditions, fields):
+        # Tags the orders this write moves, apart from those another write had already moved,
+        # and clears the tag once read so it never reaches a stored order for good
+        write_id = str(uuid.uuid4())
+        await self.collection.update_many(
+            {**mongo_filter(conditions), "id": {"$in": ids}}, {"$set": {**fields, "_write_id": write_id}}
+        )
+        stored = await self.collection.find({"id": {"$in": ids}}, {"_id": 0}).to_list(None)
+        updated = {order["id"] for order in stored if order.pop("_write_id", None) == write_id}
+        await self.collection.update_many({"_write_id": write_id}, {"$unset": {"_write_id": ""}})
+        return stored, updated
+
+    async def patch_items_if(self, conditions, patch, fields):
+        update = {"$set": dict(fields), "$inc": {"version": 1}}
+        array_filters = None
+        if patch_rewrites_items(patch):
+            # $push, $pull and element updates on one array conflict within a single update,
+            # a mixed diff writes the list it results in instead (the caller guards it)
+            update["$set"]["items"] = patch["items"]
+        elif patch["add"]:
+            update["$push"] = {"items": {"$each": patch["add"]}}
+        elif patch["remove"]:
+            update["$pull"] = {"items": {"line_id": {"$in": patch["remove"]}}}
+        elif patch["quantity"]:
+            array_filters = []
+            for index, (line_id, delta) in enumerate(patch["quantity"].items()):
+                update["$inc"][f"items.$[line{index}].quantity"] = delta
+                if delta > 0:
+                    update["$set"][f"items.$[line{index}].status"] = "queued"
+                array_filters.append({f"line{index}.line_id": line_id})
+        return await self.collection.find_one_and_update(
+            mongo_filter(conditions),
+            update,
+            array_filters=array_filters,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def update_item_if(self, conditions, line_id, item_fields, fields):
+        # Targets the one array element in place instead of rewriting the items list
+        return await self.collection.find_one_and_update(
+            {**mongo_filter(conditions), "items.line_id": line_id},
+            {"$set": {**fields, **{f"items.$[line].{name}": value for name, value in item_fields.items()}}},
+            array_filters=[{"line.line_id": line_id}],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def archive_paid(self, paid_before, limit):
+        docs = await self.collection.find({"status": "paid", "paid_at": {"$lt": paid_before}}).limit(limit).to_list(limit)
+        if not docs:
+            return 0
+        # Upserts, so a batch interrupted before the delete is simply moved again
+        await self.archive.bulk_write([ReplaceOne({"id": doc["id"]}, doc, upsert=True) for doc in docs], ordered=False)
+        result = await self.collection.delete_many({"id": {"$in": [doc["id"] for doc in docs]}, "status": "paid"})
+        return result.deleted_count
+
+    async def iter_by_status(self, status):
+        seen = set()
+        for collection in (self.collection, self.archive):
+            async for order in collection.find({"status": status}):
+                # An order caught mid-move exists in both collections
+                if order["id"] not in seen:
+                    seen.add(order["id"])
+                    yield order
+
+    async def aggregate(self, pipeline: list) -> List[dict]:
+        return await self.collection.aggregate(pipeline).to_list(None)
+
+    async def kitchen_queue(self, status, limit, prep_statuses):
+        # One round-trip: both facets share the match, served by the (status, created_at, id) index
+        rows = await self.aggregate([
+            {"$match": {"status": {"$in": sorted(set(prep_statuses) | {status})}}},
+            {"$sort": {"created_at": 1, "id": 1}},
+            {"$facet": {
+                "orders": [{"$match": {"status": status}}, {"$limit": limit}, {"$project": {"_id": 0}}],
+                "to_prepare": [
+                    {"$match": {"status": {"$in": prep_statuses}}},
+                    {"$unwind": "$items"},
+                    # Lines stored before per-line status have none and still count
+                    {"$match": {"items.status": {"$ne": "done"}}},
+                    {"$group": {
+                        "_id": "$items.menu_item_id",
+                        "name": {"$last": "$items.menu_item_name"},
+                        "quantity": {"$sum": "$items.quantity"},
+                        "cooking": {"$sum": {"$cond": [{"$eq": ["$items.status", "cooking"]}, "$items.quantity", 0]}},
+                        "order_ids": {"$addToSet": "$id"},
+                        "oldest_at": {"$min": "$created_at"},
+                    }},
+                    {"$sort": {"quantity": -1, "_id": 1}},
+                ],
+            }},
+        ])
+        facets = rows[0] if rows else {"orders": [], "to_prepare": []}
+        return {
+            "orders": facets["orders"],
+            "to_prepare": [
+                {
+                    "menu_item_id": row["_id"],
+                    "name": row["name"],
+                    "quantity": row["quantity"],
+                    "cooking": row["cooking"],
+                    "orders": len(row["order_ids"]),
+                    "oldest_at": row["oldest_at"],
+                }
+                for row in facets["to_prepare"]
+            ],
+        }
+
+    def match_with_archive(self, match: dict) -> list:
+        """Pipeline head selecting `match` from the hot collection and the archive (MongoDB 4.4+)."""
+        return [{"$match": match}, {"$unionWith": {"coll": self.archive.name, "pipeline": [{"$match": match}]}}]
+
+    async def count_by_status(self, created, statuses=None):
+        match = mongo_range("created_at", created)
+        if statuses is not None:
+            match["status"] = {"$in": statuses}
+        # Only paid orders are ever archived
+        head = self.match_with_archive(match) if statuses is None or "paid" in statuses else [{"$match": match}]
+        rows = await self.aggregate([
+            *head,
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        ])
+        return {row["_id"]: row["count"] for row in rows}
+
+    async def paid_breakdown(self, paid, timezone, top_items):
+        head = self.match_with_archive({"status": "paid", **mongo_range("paid_at", paid)})
+        totals, by_day, by_hour, items, servers = await asyncio.gather(
+            self.aggregate([
+                *head,
+                {"$group": {"_id": None, "revenue": {"$sum": "$total_amount"}, "orders": {"$sum": 1}}},
+            ]),
+            self.aggregate([
+                *head,
+                {"$group": {
+                    "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$paid_at", "timezone": timezone}},
+                    "revenue": {"$sum": "$total_amount"},
+                    "orders": {"$sum": 1},
+                }},
+                {"$sort": {"_id": 1}},
+            ]),
+            self.aggregate([
+                *head,
+                {"$group": {
+                    "_id": {"$hour": {"date": "$paid_at", "timezone": timezone}},
+                    "revenue": {"$sum": "$total_amount"},
+                    "orders": {"$sum": 1},
+                }},
+                {"$sort": {"_id": 1}},
+            ]),
+            self.aggregate([
+                *head,
+                {"$unwind": "$items"},
+                {"$group": {
+                    "_id": "$items.menu_item_id",
+                    "name": {"$last": "$items.menu_item_name"},
+                    "quantity": {"$sum": "$items.quantity"},
+                    "revenue": {"$sum": {"$multiply": ["$items.price", "$items.quantity"]}},
+                }},
+                {"$sort": {"quantity": -1, "_id": 1}},
+                {"$limit": top_items},
+            ]),
+            self.aggregate([
+                *head,
+                {"$group": {
+                    "_id": "$server_id",
+                    "server_name": {"$last": "$server_name"},
+                    "revenue": {"$sum": "$total_amount"},
+                    "orders": {"$sum": 1},
+                }},
+                {"$sort": {"revenue": -1}},
+            ]),
+        )
+
+        return {
+            "revenue": totals[0]["revenue"] if totals else 0.0,
+            "orders": totals[0]["orders"] if totals else 0,
+            "by_day": [{"date": row["_id"], "revenue": row["revenue"], "orders": row["orders"]} for row in by_day],
+            "by_hour": [{"hour": row["_id"], "revenue": row["revenue"], "orders": row["orders"]} for row in by_hour],
+            "top_items": [
+                {"menu_item_id": row["_id"], "name": row["name"], "quantity": row["quantity"], "revenue": row["revenue"]}
+                for row in items
+            ],
+            "servers": [
+                {"server_id": row["_id"], "server_name": row["server_name"], "revenue": row["revenue"], "orders": row["orders"]}
+                for row in servers
+            ],
+        }
+
+
+class MongoDailyStatsRepository(DailyStatsRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def increment(self, day, increments, fields):
+        await self.collection.update_one({"date": day}, {"$inc": increments, "$set": fields}, upsert=True)
+
+    async def replace_days(self, days, before):
+        # Upserts day by day, never leaving the collection empty or racing the unique date index
+        if days:
+            await self.collection.bulk_write(
+                [ReplaceOne({"date": day["date"]}, dict(day), upsert=True) for day in days], ordered=False
+            )
+        await self.collection.delete_many({"date": {"$lt": before, "$nin": [day["date"] for day in days]}})
+
+    async def is_empty(self):
+        return await self.collection.find_one({}, {"_id": 1}) is None
+
+    async def list_days(self, start_day, end_day):
+        bounds = {}
+        if start_day is not None:
+            bounds["$gte"] = start_day
+        if end_day is not None:
+            bounds["$lt"] = end_day
+        return await self.collection.find({"date": bounds} if bounds else {}).sort("date", 1).to_list(None)
+
+
+class MongoTableStatesRepository(TableStatesRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def replace_if_newer(self, state):
+        try:
+            result = await self.collection.update_one(
+                {"table_number": state["table_number"], "computed_at": {"$lt": state["computed_at"]}},
+                {"$set": state},
+                upsert=True,
+            )
+        except MongoDuplicateKeyError:
+            # The upsert lost to a state computed later for the same table
+            return False
+        return result.matched_count > 0 or result.upserted_id is not None
+
+    async def list_all(self):
+        return await self.collection.find({}, {"_id": 0}).sort("table_number", 1).to_list(None)
+
+
+class MongoIdempotencyRepository(IdempotencyRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def claim(self, record):
+        owner = {"user_id": record["user_id"], "key": record["key"]}
+        try:
+            await self.collection.insert_one(dict(record))
+            return None
+        except MongoDuplicateKeyError:
+            pass
+        # The TTL monitor runs about once a minute, an expired record may still be there
+        taken_over = await self.collection.find_one_and_replace(
+            {**owner, "expires_at": {"$lte": record["created_at"]}}, dict(record)
+        )
+        if taken_over is not None:
+            return None
+        existing = await self.collection.find_one(owner, {"_id": 0})
+        # Released or expired in between, try again
+        return existing if existing is not None else await self.claim(record)
+
+    async def complete(self, user_id, key, fields):
+        await self.collection.update_one({"user_id": user_id, "key": key}, {"$set": fields})
+
+    async def release(self, user_id, key):
+        await self.collection.delete_one({"user_id": user_id, "key": key, "response": None})
+
+
+class MongoRevokedUsersRepository(RevokedUsersRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def add(self, user_id, expires_at):
+        await self.collection.update_one({"user_id": user_id}, {"$set": {"expires_at": expires_at}}, upsert=True)
+
+    async def list_active(self, now):
+        return await self.collection.find({"expires_at": {"$gt": now}}, {"_id": 0}).to_list(None)
+
+
+class MongoLocksRepository(LocksRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def acquire(self, name, owner, expires_at, now):
+        lock = {"name": name, "owner": owner, "expires_at": expires_at}
+        try:
+            await self.collection.insert_one(dict(lock))
+            return True
+        except MongoDuplicateKeyError:
+            pass
+        # A holder that died leaves its lock until it expires, the TTL monitor may not have run yet
+        taken_over = await self.collection.find_one_and_replace({"name": name, "expires_at": {"$lte": now}}, lock)
+        return taken_over is not None
+
+    async def release(self, name, owner):
+        await self.collection.delete_one({"name": name, "owner": owner})
+
+
+class MongoStorage(Storage):
+    def __init__(self, mongo_url: str, db_name: str):
+        self.client = AsyncIOMotorClient(mongo_url)
+        self.db = self.client[db_name]
+        self.users = MongoUsersRepository(self.db.users)
+        self.menu = MongoMenuRepository(self.db.menu_items)
+        self.orders = MongoOrdersRepository(self.db.orders, self.db.orders_archive)
+        self.daily_stats = MongoDailyStatsRepository(self.db.daily_stats)
+        self.tables = MongoTableStatesRepository(self.db.table_states)
+        self.idempotency = MongoIdempotencyRepository(self.db.idempotency_keys)
+        self.revoked_users = MongoRevokedUsersRepository(self.db.revoked_users)
+        self.locks = MongoLocksRepository(self.db.locks)
+
+    async def ensure_indexes(self):
+        statuses = []
+        for collection, keys, unique, options in index_specs():
+            entry = {"collection": collection, "keys": [key for key, _ in keys], "unique": unique}
+            try:
+                entry["name"] = await self.db[collection].create_index(keys, unique=unique, **options)
+                entry["status"] = "ready"
+            except PyMongoError as e:
+                entry["status"] = "failed"
+                entry["error"] = str(e)
+            statuses.append(entry)
+        for collection, keys in RETIRED_INDEXES:
+            try:
+                await self.db[collection].drop_index(keys)
+            except PyMongoError:
+                # Already gone, or left for next start; a leftover only costs writes
+                pass
+        return statuses
+
+    def close(self):
+        self.client.close()
+
+
+# In memory
+def matches(doc: dict, filters: dict) -> bool:
+    for key, value in filters.items():
+        if isinstance(value, list):
+            if doc.get(key) not in value:
+                return False
+        elif doc.get(key) != value:
+            return False
+    return True
+
+
+def in_range(moment: Optional[datetime], bounds: DateRange) -> bool:
+    start, end = bounds
+    if start is None and end is None:
+        return True
+    if moment is None:
+        return False
+    return (start is None or moment >= start) and (end is None or moment < end)
+
+
+def page_key(doc: dict) -> PageKey:
+    return doc["created_at"], doc["id"]
+
+
+def set_path(doc: dict, path: str, value, increment: bool = False):
+    *parents, leaf = path.split(".")
+    for key in parents:
+        doc = doc.setdefault(key, {})
+    doc[leaf] = doc.get(leaf, 0) + value if increment else value
+
+
+def copy_page(docs: List[dict], limit: int, after: Optional[PageKey], descending: bool = False) -> List[dict]:
+    docs = sorted(docs, key=page_key)
+    if descending:
+        end = bisect.bisect_left([page_key(doc) for doc in docs], after) if after else len(docs)
+        return copy.deepcopy(docs[max(0, end - limit):end][::-1])
+    start = bisect.bisect_right([page_key(doc) for doc in docs], after) if after else 0
+    return copy.deepcopy(docs[start:start + limit])
+
+
+class MemoryUsersRepository(UsersRepository):
+    def __init__(self):
+        self.docs = {}
+
+    async def get(self, user_id):
+        return copy.deepcopy(self.docs.get(user_id))
+
+    async def get_by_username(self, username):
+        return next((copy.deepcopy(doc) for doc in self.docs.values() if doc["username"] == username), None)
+
+    async def get_by_role(self, role):
+        return next((copy.deepcopy(doc) for doc in self.docs.values() if doc["role"] == role), None)
+
+    async def insert(self, user):
+        if user["id"] in self.docs or any(doc["username"] == user["username"] for doc in self.docs.values()):
+            raise DuplicateKeyError(user["username"])
+        self.docs[user["id"]] = copy.deepcopy(user)
+
+    async def delete(self, user_id):
+        return self.docs.pop(user_id, None) is not None
+
+    async def list_page(self, limit, after=None):
+        return copy_page(list(self.docs.values()), limit, after)
+
+
+class MemoryMenuRepository(MenuRepository):
+    def __init__(self):
+        self.docs = {}
+
+    async def list_all(self):
+        return copy_page(list(self.docs.values()), len(self.docs), None)
+
+    async def insert(self, item):
+        if item["id"] in self.docs:
+            raise DuplicateKeyError(item["id"])
+        self.docs[item["id"]] = copy.deepcopy(item)
+
+    async def update(self, item_id, fields):
+        doc = self.docs.get(item_id)
+        if doc is None or all(doc.get(key) == value for key, value in fields.items()):
+            return False
+        doc.update(copy.deepcopy(fields))
+        return True
+
+    async def delete(self, item_id):
+        return self.docs.pop(item_id, None) is not None
+
+
+class MemoryOrdersRepository(OrdersRepository):
+    def __init__(self):
+        self.docs = {}
+        self.archive = {}
+
+    def all_docs(self) -> List[dict]:
+        return [*self.docs.values(), *self.archive.values()]
+
+    async def insert(self, order):
+        if order["id"] in self.docs:
+            raise DuplicateKeyError(order["id"])
+        self.docs[order["id"]] = copy.deepcopy(order)
+
+    async def get(self, order_id):
+        return copy.deepcopy(self.docs.get(order_id))
+
+    async def list_page(self, filters, limit, after=None, fields=None, created=None, archived=False, descending=False):
+        source = self.archive if archived else self.docs
+        created = created or (None, None)
+        docs = [doc for doc in source.values() if matches(doc, filters) and in_range(doc["created_at"], created)]
+        if fields:
+            docs = [{field: doc[field] for field in fields if field in doc} for doc in docs]
+        return copy_page(docs, limit, after, descending)
+
+    async def list_changed(self, filters, since, limit, after_id=None):
+        start = (since, after_id) if after_id is not None else None
+        changed = [
+            doc for doc in self.docs.values()
+            if matches(doc, filters) and doc["updated_at"] >= since
+            and (start is None or (doc["updated_at"], doc["id"]) > start)
+        ]
+        return copy.deepcopy(sorted(changed, key=lambda doc: (doc["updated_at"], doc["id"]))[:limit])
+
+    async def change_marker(self, filters):
+        updated = [doc["updated_at"] for doc in self.docs.values() if matches(doc, filters)]
+        return len(updated), max(updated, default=None)
+
+    async def update_if(self, conditions, fields, increments=None):
+        doc = self.docs.get(conditions.get("id"))
+        if doc is None or not matches(doc, conditions):
+            return None
+        doc.update(copy.deepcopy(fields))
+        for name, amount in (increments or {}).items():
+            doc[name] = doc.get(name, 0) + amount
+        return copy.deepcopy(doc)
+
+    async def update_many_if(self, ids, conditions, fields):
+        stored = [self.docs[order_id] for order_id in ids if order_id in self.docs]
+        updated = set()
+        for doc in stored:
+            if matches(doc, conditions):
+                doc.update(copy.deepcopy(fields))
+                updated.add(doc["id"])
+        return copy.deepcopy(stored), updated
+
+    async def patch_items_if(self, conditions, patch, fields):
+        doc = self.docs.get(conditions.get("id"))
+        if doc is None or not matches(doc, conditions):
+            return None
+        doc.update(copy.deepcopy(fields))
+        if patch_rewrites_items(patch):
+            doc["items"] = copy.deepcopy(patch["items"])
+        else:
+            # Applied to the stored lines like MongoDB does, leaving the status of untouched lines alone
+            items = [item for item in doc["items"] if item.get("line_id") not in patch["remove"]]
+            for item in items:
+                delta = patch["quantity"].get(item.get("line_id"), 0)
+                item["quantity"] += delta
+                if delta > 0:
+                    item["status"] = "queued"
+            doc["items"] = items + copy.deepcopy(patch["add"])
+        doc["version"] = doc.get("version", 0) + 1
+        return copy.deepcopy(doc)
+
+    async def update_item_if(self, conditions, line_id, item_fields, fields):
+        doc = self.docs.get(conditions.get("id"))
+        if doc is None or not matches(doc, conditions):
+            return None
+        line = next((item for item in doc["items"] if item.get("line_id") == line_id), None)
+        if line is None:
+            return None
+        line.update(copy.deepcopy(item_fields))
+        doc.update(copy.deepcopy(fields))
+        return copy.deepcopy(doc)
+
+    async def archive_paid(self, paid_before, limit):
+        moved = [
+            doc for doc in self.docs.values()
+            if doc["status"] == "paid" and doc.get("paid_at") is not None and doc["paid_at"] < paid_before
+        ][:limit]
+        for doc in moved:
+            self.archive[doc["id"]] = self.docs.pop(doc["id"])
+        return len(moved)
+
+    async def iter_by_status(self, status):
+        for doc in [doc for doc in self.all_docs() if doc["status"] == status]:
+            yield copy.deepcopy(doc)
+
+    async def kitchen_queue(self, status, limit, prep_statuses):
+        open_docs = sorted(
+            (doc for doc in self.docs.values() if doc["status"] == status or doc["status"] in prep_statuses),
+            key=page_key,
+        )
+        queued = [doc for doc in open_docs if doc["status"] == status]
+        to_prepare = {}
+        for doc in (doc for doc in open_docs if doc["status"] in prep_statuses):
+            for item in doc["items"]:
+                if item.get("status") == "done":
+                    continue
+                row = to_prepare.setdefault(item["menu_item_id"], {
+                    "menu_item_id": item["menu_item_id"],
+                    "quantity": 0,
+                    "cooking": 0,
+                    "order_ids": set(),
+                    "oldest_at": doc["created_at"],
+                })
+                row["name"] = item["menu_item_name"]
+                row["quantity"] += item["quantity"]
+                if item.get("status") == "cooking":
+                    row["cooking"] += item["quantity"]
+                row["order_ids"].add(doc["id"])
+        return {
+            "orders": copy.deepcopy(queued[:limit]),
+            "to_prepare": [
+                {**{key: value for key, value in row.items() if key != "order_ids"}, "orders": len(row["order_ids"])}
+                for row in sorted(to_prepare.values(), key=lambda row: (-row["quantity"], row["menu_item_id"]))
+            ],
+        }
+
+    async def count_by_status(self, created, statuses=None):
+        counts = defaultdict(int)
+        for doc in self.all_docs():
+            if in_range(doc.get("created_at"), created) and (statuses is None or doc["status"] in statuses):
+                counts[doc["status"]] += 1
+        return dict(counts)
+
+    async def paid_breakdown(self, paid, timezone, top_items):
+        zone = ZoneInfo(timezone)
+        revenue, orders = 0.0, 0
+        by_day = defaultdict(lambda: {"revenue": 0.0, "orders": 0})
+        by_hour = defaultdict(lambda: {"revenue": 0.0, "orders": 0})
+        items = defaultdict(lambda: {"name": None, "quantity": 0, "revenue": 0.0})
+        servers = defaultdict(lambda: {"server_name": None, "revenue": 0.0, "orders": 0})
+
+        for doc in self.all_docs():
+            if doc["status"] != "paid" or not in_range(doc.get("paid_at"), paid):
+                continue
+            local = doc["paid_at"].replace(tzinfo=dt_timezone.utc).astimezone(zone)
+            revenue += doc["total_amount"]
+            orders += 1
+            for bucket in (by_day[local.date().isoformat()], by_hour[local.hour], servers[doc["server_id"]]):
+                bucket["revenue"] += doc["total_amount"]
+                bucket["orders"] += 1
+            servers[doc["server_id"]]["server_name"] = doc["server_name"]
+            for item in doc["items"]:
+                line = items[item["menu_item_id"]]
+                line["name"] = item["menu_item_name"]
+                line["quantity"] += item["quantity"]
+                line["revenue"] += item["price"] * item["quantity"]
+
+        ranked_items = sorted(items.items(), key=lambda entry: (-entry[1]["quantity"], entry[0]))[:top_items]
+        return {
+            "revenue": revenue,
+            "orders": orders,
+            "by_day": [{"date": day, **values} for day, values in sorted(by_day.items())],
+            "by_hour": [{"hour": hour, **values} for hour, values in sorted(by_hour.items())],
+            "top_items": [{"menu_item_id": item_id, **values} for item_id, values in ranked_items],
+            "servers": [
+                {"server_id": server_id, **values}
+                for server_id, values in sorted(servers.items(), key=lambda entry: -entry[1]["revenue"])
+            ],
+        }
+
+
+class MemoryDailyStatsRepository(DailyStatsRepository):
+    def __init__(self):
+        self.docs = {}
+
+    async def increment(self, day, increments, fields):
+        doc = self.docs.setdefault(day, {"date": day})
+        for path, value in increments.items():
+            set_path(doc, path, value, increment=True)
+        for path, value in fields.items():
+            set_path(doc, path, copy.deepcopy(value))
+
+    async def replace_days(self, days, before):
+        kept = {date: doc for date, doc in self.docs.items() if date >= before}
+        self.docs = {**kept, **{day["date"]: copy.deepcopy(day) for day in days}}
+
+    async def is_empty(self):
+        return not self.docs
+
+    async def list_days(self, start_day, end_day):
+        return [
+            copy.deepcopy(doc) for day, doc in sorted(self.docs.items())
+            if (start_day is None or day >= start_day) and (end_day is None or day < end_day)
+        ]
+
+
+class MemoryTableStatesRepository(TableStatesRepository):
+    def __init__(self):
+        self.docs = {}
+
+    async def replace_if_newer(self, state):
+        current = self.docs.get(state["table_number"])
+        if current is not None and current["computed_at"] >= state["computed_at"]:
+            return False
+        self.docs[state["table_number"]] = copy.deepcopy(state)
+        return True
+
+    async def list_all(self):
+        return [copy.deepcopy(doc) for _, doc in sorted(self.docs.items())]
+
+
+class MemoryIdempotencyRepository(IdempotencyRepository):
+    def __init__(self):
+        self.docs = {}
+
+    async def claim(self, record):
+        owner = (record["user_id"], record["key"])
+        existing = self.docs.get(owner)
+        if existing is not None and existing["expires_at"] > record["created_at"]:
+            return copy.deepcopy(existing)
+        self.docs[owner] = copy.deepcopy(record)
+        return None
+
+    async def complete(self, user_id, key, fields):
+        if (user_id, key) in self.docs:
+            self.docs[(user_id, key)].update(copy.deepcopy(fields))
+
+    async def release(self, user_id, key):
+        record = self.docs.get((user_id, key))
+        if record is not None and record["response"] is None:
+            del self.docs[(user_id, key)]
+
+
+class MemoryRevokedUsersRepository(RevokedUsersRepository):
+    def __init__(self):
+        self.docs = {}
+
+    async def add(self, user_id, expires_at):
+        self.docs[user_id] = {"user_id": user_id, "expires_at": expires_at}
+
+    async def list_active(self, now):
+        return [copy.deepcopy(doc) for doc in self.docs.values() if doc["expires_at"] > now]
+
+
+class MemoryLocksRepository(LocksRepository):
+    def __init__(self):
+        self.docs = {}
+
+    async def acquire(self, name, owner, expires_at, now):
+        current = self.docs.get(name)
+        if current is not None and current["expires_at"] > now:
+            return False
+        self.docs[name] = {"name": name, "owner": owner, "expires_at": expires_at}
+        return True
+
+    async def release(self, name, owner):
+        if self.docs.get(name, {}).get("owner") == owner:
+            del self.docs[name]
+
+
+class MemoryStorage(Storage):
+    """Process-local storage, for tests, benchmarks and demos. Nothing is persisted."""
+
+    def __init__(self):
+        self.users = MemoryUsersRepository()
+        self.menu = MemoryMenuRepository()
+        self.orders = MemoryOrdersRepository()
+        self.daily_stats = MemoryDailyStatsRepository()
+        self.tables = MemoryTableStatesRepository()
+        self.idempotency = MemoryIdempotencyRepository()
+        self.revoked_users = MemoryRevokedUsersRepository()
+        self.locks = MemoryLocksRepository()
+
+    async def ensure_indexes(self):
+        # Uniqueness of ids and usernames is enforced by the repositories themselves, expiry on access
+        return [
+            {"collection": collection, "keys": [key for key, _ in keys], "unique": unique, "status": "ready"}
+            for collection, keys, unique, _ in index_specs()
+        ]
+
+
+def create_storage(backend: str, mongo_url: Optional[str] = None, db_name: Optional[str] = None) -> Storage:
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "mongo":
+        if not mongo_url or not db_name:
+            raise RuntimeError("MONGO_URL and DB_NAME are required for the mongo storage backend")
+        return MongoStorage(mongo_url, db_name)
+    raise RuntimeError(f"Unknown storage backend: {backend}")
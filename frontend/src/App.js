@@ -1,4 +1,4 @@
-import React, { useState, useEffect, createContext, useContext } from 'react';
+import React, { useState, useEffect, useRef, useCallback, createContext, useContext } from 'react';
 import axios from 'axios';
 import './App.css';
 
@@ -16,6 +16,147 @@ const useAuth = () => {
   return context;
 };
 
+// List endpoints are paginated: follow X-Next-Cursor until every page is loaded
+const fetchAllPages = async (url, params = {}) => {
+  const firstResponse = await axios.get(url, { params });
+  let items = firstResponse.data;
+  let after = firstResponse.headers['x-next-cursor'];
+  while (after) {
+    const response = await axios.get(url, { params: { ...params, after } });
+    items = items.concat(response.data);
+    after = response.headers['x-next-cursor'];
+  }
+  return { items, headers: firstResponse.headers };
+};
+
+// Writes a flaky network may cut off are retried with the same Idempotency-Key, the server runs them once
+const sendIdempotent = async (method, url, data, key, attempts = 3) => {
+  for (let attempt = 1; ; attempt++) {
+    try {
+      return await axios({ method, url, data, headers: { 'Idempotency-Key': key } });
+    } catch (error) {
+      if (error.response || attempt >= attempts) throw error;
+    }
+  }
+};
+
+const newIdempotencyKey = () => `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
+// Moves many orders to a status in one request, alerts how many could not be moved
+const bulkUpdateStatus = async (orderIds, status) => {
+  if (orderIds.length === 0) return;
+  try {
+    const response = await axios.post(`${API}/orders/bulk-status`, { order_ids: orderIds, status });
+    const skipped = orderIds.length - response.data.updated;
+    alert(skipped > 0
+      ? `${response.data.updated} commande(s) mises à jour, ${skipped} déjà modifiée(s)`
+      : `${response.data.updated} commande(s) mises à jour`);
+  } catch (error) {
+    console.error('Failed to update orders:', error);
+    alert('Erreur lors de la mise à jour');
+  }
+};
+
+// A response read before an event may arrive after it, never let an older copy win
+const isNewer = (order, existing) =>
+  !order.updated_at || !existing.updated_at || Date.parse(order.updated_at) >= Date.parse(existing.updated_at);
+
+const upsertOrder = (orders, order) => {
+  if (orders.some((existing) => existing.id === order.id)) {
+    return orders.map((existing) => (existing.id === order.id && isNewer(order, existing) ? order : existing));
+  }
+  return [...orders, order];
+};
+
+// Live order updates pushed by the server. The returned fetchOrders does a full
+// load first and then only asks for orders changed since the last cursor.
+const useOrderStream = (setOrders) => {
+  const { token } = useAuth();
+  const cursorRef = useRef(null);
+  // Set while a has_more delta is being continued, resumes right after the last order received
+  const afterIdRef = useRef(null);
+
+  const fetchOrders = useCallback(async () => {
+    try {
+      if (cursorRef.current) {
+        const params = { since: cursorRef.current };
+        if (afterIdRef.current) params.after_id = afterIdRef.current;
+        const response = await axios.get(`${API}/orders`, { params });
+        const { orders, removed, cursor, has_more, after_id } = response.data;
+        setOrders((current) =>
+          orders.reduce(upsertOrder, current.filter((existing) => !removed.includes(existing.id)))
+        );
+        cursorRef.current = cursor;
+        afterIdRef.current = has_more ? after_id : null;
+        if (has_more) {
+          fetchOrders();
+        }
+      } else {
+        const { items, headers } = await fetchAllPages(`${API}/orders`);
+        setOrders(items);
+        cursorRef.current = headers['x-orders-cursor'];
+        // Events applied while the pages loaded were overwritten by this snapshot, catch up from its cursor
+        await fetchOrders();
+      }
+    } catch (error) {
+      console.error('Failed to fetch orders:', error);
+    }
+  }, [setOrders]);
+
+  useEffect(() => {
+    if (!token) return;
+
+    let source = null;
+    let lastEventId = null;
+    let closed = false;
+
+    const reconnectLater = () => {
+      if (!closed) setTimeout(connect, 3000);
+    };
+
+    const connect = async () => {
+      try {
+        // The stream URL carries a short-lived ticket rather than the login token
+        const response = await axios.post(`${API}/orders/events/ticket`);
+        if (closed) return;
+        const params = new URLSearchParams({ ticket: response.data.ticket });
+        if (lastEventId) params.set('last_event_id', lastEventId);
+        source = new EventSource(`${API}/orders/events?${params}`);
+      } catch (error) {
+        console.error('Failed to open order stream:', error);
+        reconnectLater();
+        return;
+      }
+
+      source.addEventListener('order', (event) => {
+        lastEventId = event.lastEventId;
+        const { order, visible } = JSON.parse(event.data);
+        setOrders((current) =>
+          visible ? upsertOrder(current, order) : current.filter((existing) => existing.id !== order.id)
+        );
+      });
+      source.addEventListener('resync', (event) => {
+        lastEventId = event.lastEventId;
+        fetchOrders();
+      });
+      // Once the ticket has expired the browser's own reconnect is refused, fetch a new one
+      source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) reconnectLater();
+      };
+    };
+
+    fetchOrders();
+    connect();
+
+    return () => {
+      closed = true;
+      if (source) source.close();
+    };
+  }, [token, fetchOrders]);
+
+  return fetchOrders;
+};
+
 const AuthProvider = ({ children }) => {
   const [user, setUser] = useState(null);
   const [token, setToken] = useState(localStorage.getItem('token'));
@@ -174,33 +315,53 @@ const ServerDashboard = () => {
   const [orders, setOrders] = useState([]);
   const [menu, setMenu] = useState([]);
   const [selectedTable, setSelectedTable] = useState(1);
+  const [tables, setTables] = useState([]);
   const [currentOrder, setCurrentOrder] = useState([]);
   const [showCreateOrder, setShowCreateOrder] = useState(false);
   const [showEditOrder, setShowEditOrder] = useState(false);
   const [editingOrder, setEditingOrder] = useState(null);
+  // Kept until the order is accepted, so sending it again cannot create a duplicate
+  const orderKeyRef = useRef(null);
   const { user, logout } = useAuth();
 
   useEffect(() => {
-    fetchOrders();
     fetchMenu();
   }, []);
 
-  const fetchOrders = async () => {
+  const fetchOrders = useOrderStream(setOrders);
+
+  // Floor plan in one read, refreshed whenever the order stream changes something
+  useEffect(() => {
+    fetchTables();
+  }, [orders]);
+
+  const fetchMenu = async () => {
     try {
-      const response = await axios.get(`${API}/orders`);
-      setOrders(response.data);
+      const { items } = await fetchAllPages(`${API}/menu`);
+      setMenu(items);
     } catch (error) {
-      console.error('Failed to fetch orders:', error);
+      console.error('Failed to fetch menu:', error);
     }
   };
 
-  const fetchMenu = async () => {
+  const fetchTables = async () => {
     try {
-      const response = await axios.get(`${API}/menu`);
-      setMenu(response.data);
+      const response = await axios.get(`${API}/tables`);
+      setTables(response.data);
     } catch (error) {
-      console.error('Failed to fetch menu:', error);
+      console.error('Failed to fetch tables:', error);
+    }
+  };
+
+  const tableLabel = (table) => {
+    if (!table.status) {
+      return `Table ${table.table_number}`;
     }
+    if (table.status === 'free') {
+      return `Table ${table.table_number} - libre`;
+    }
+    const status = table.status === 'ready' ? 'prête' : 'en cuisine';
+    return `Table ${table.table_number} - ${status} - ${table.running_total.toFixed(2)} TND`;
   };
 
   const addToOrder = (menuItem) => {
@@ -208,7 +369,7 @@ const ServerDashboard = () => {
     if (existingItem) {
       setCurrentOrder(currentOrder.map(item =>
         item.menu_item_id === menuItem.id
-          ? { ...item, quantity: item.quantity + 1 }
+          ? { ...item, quantity: item.quantity + 1, status: 'queued' }
           : item
       ));
     } else {
@@ -231,7 +392,8 @@ const ServerDashboard = () => {
     } else {
       setCurrentOrder(currentOrder.map(item =>
         item.menu_item_id === menuItemId
-          ? { ...item, quantity }
+          // Extra portions of a line the kitchen already finished still have to be cooked
+          ? { ...item, quantity, status: quantity > item.quantity ? 'queued' : item.status }
           : item
       ));
     }
@@ -244,10 +406,12 @@ const ServerDashboard = () => {
     }
 
     try {
-      await axios.post(`${API}/orders`, {
+      orderKeyRef.current = orderKeyRef.current || newIdempotencyKey();
+      await sendIdempotent('post', `${API}/orders`, {
         table_number: selectedTable,
         items: currentOrder
-      });
+      }, orderKeyRef.current);
+      orderKeyRef.current = null;
       setCurrentOrder([]);
       setShowCreateOrder(false);
       fetchOrders();
@@ -265,6 +429,23 @@ const ServerDashboard = () => {
     setShowEditOrder(true);
   };
 
+  // Only what changed since the order was opened for editing is sent
+  const itemChanges = () => {
+    const changes = [];
+    editingOrder.items.forEach(original => {
+      const current = currentOrder.find(item => item.line_id === original.line_id);
+      if (!current) {
+        changes.push({ op: 'remove', line_id: original.line_id });
+      } else if (current.quantity !== original.quantity) {
+        changes.push({ op: 'quantity', line_id: original.line_id, quantity: current.quantity });
+      }
+    });
+    currentOrder.filter(item => !item.line_id).forEach(item => {
+      changes.push({ op: 'add', menu_item_id: item.menu_item_id, quantity: item.quantity });
+    });
+    return changes;
+  };
+
   const updateExistingOrder = async () => {
     if (currentOrder.length === 0) {
       alert('Une commande doit contenir au moins un article');
@@ -272,9 +453,16 @@ const ServerDashboard = () => {
     }
 
     try {
-      await axios.put(`${API}/orders/${editingOrder.id}`, {
-        items: currentOrder
-      });
+      const version = editingOrder.version || 0;
+      if (editingOrder.items.some(item => !item.line_id)) {
+        // Lines stored before line ids can only be replaced as a whole
+        await axios.put(`${API}/orders/${editingOrder.id}`, { items: currentOrder, version });
+      } else {
+        const changes = itemChanges();
+        if (changes.length > 0) {
+          await axios.patch(`${API}/orders/${editingOrder.id}`, { version, changes });
+        }
+      }
       setCurrentOrder([]);
       setShowEditOrder(false);
       setEditingOrder(null);
@@ -282,7 +470,13 @@ const ServerDashboard = () => {
       alert('Commande modifiée avec succès!');
     } catch (error) {
       console.error('Failed to update order:', error);
-      alert('Erreur lors de la modification de la commande');
+      if (error.response && error.response.status === 409) {
+        alert('Commande modifiée depuis un autre appareil, veuillez la rouvrir');
+        cancelEdit();
+        fetchOrders();
+      } else {
+        alert('Erreur lors de la modification de la commande');
+      }
     }
   };
 
@@ -398,8 +592,8 @@ const ServerDashboard = () => {
                 onChange={(e) => setSelectedTable(Number(e.target.value))}
                 className="border rounded px-3 py-2"
               >
-                {[1, 2, 3, 4, 5, 6, 7, 8].map(num => (
-                  <option key={num} value={num}>Table {num}</option>
+                {(tables.length ? tables : [1, 2, 3, 4, 5, 6, 7, 8].map(num => ({ table_number: num }))).map(table => (
+                  <option key={table.table_number} value={table.table_number}>{tableLabel(table)}</option>
                 ))}
               </select>
             </div>
@@ -625,30 +819,38 @@ const ServerDashboard = () => {
 // Chef Dashboard
 const ChefDashboard = () => {
   const [orders, setOrders] = useState([]);
+  const [queue, setQueue] = useState({ orders: [], to_prepare: [] });
   const { user, logout } = useAuth();
 
+  const fetchOrders = useOrderStream(setOrders);
+
+  // Kitchen queue (oldest first) and per-dish totals, refreshed whenever the order stream changes something
   useEffect(() => {
-    fetchOrders();
-    // Auto-refresh orders every 30 seconds
-    const interval = setInterval(fetchOrders, 30000);
-    return () => clearInterval(interval);
-  }, []);
+    fetchQueue();
+  }, [orders]);
 
-  const fetchOrders = async () => {
+  const fetchQueue = async () => {
     try {
-      const response = await axios.get(`${API}/orders`);
-      setOrders(response.data);
+      const response = await axios.get(`${API}/kitchen/queue`);
+      setQueue(response.data);
     } catch (error) {
-      console.error('Failed to fetch orders:', error);
+      console.error('Failed to fetch kitchen queue:', error);
+    }
+  };
+
+  const advanceItem = async (order, item) => {
+    const next = { queued: 'cooking', cooking: 'done', done: 'queued' }[item.status || 'queued'];
+    try {
+      await axios.put(`${API}/orders/${order.id}/items/${item.line_id}`, { status: next });
+    } catch (error) {
+      console.error('Failed to update item status:', error);
+      alert('Erreur lors de la mise à jour');
     }
   };
 
   const markOrderReady = async (orderId) => {
     try {
-      await axios.put(`${API}/orders/${orderId}`, {
-        status: 'ready'
-      });
-      fetchOrders();
+      await sendIdempotent('put', `${API}/orders/${orderId}`, { status: 'ready' }, `ready-${orderId}`);
       alert('Commande marquée comme prête!');
     } catch (error) {
       console.error('Failed to mark order ready:', error);
@@ -678,10 +880,36 @@ const ChefDashboard = () => {
       </div>
 
       <div className="p-6">
-        <h2 className="text-2xl font-bold text-gray-800 mb-6">Commandes à préparer</h2>
+        {queue.to_prepare.length > 0 && (
+          <div className="bg-white rounded-lg shadow-md p-6 mb-8">
+            <h2 className="text-xl font-bold text-gray-800 mb-4">À préparer</h2>
+            <ul className="grid gap-2 md:grid-cols-2 lg:grid-cols-4">
+              {queue.to_prepare.map(item => (
+                <li key={item.menu_item_id} className="flex justify-between bg-orange-50 rounded px-3 py-2">
+                  <span>{item.name}</span>
+                  <span className="font-bold text-orange-600">
+                    x{item.quantity}{item.cooking > 0 && ` (${item.cooking} en cuisson)`}
+                  </span>
+                </li>
+              ))}
+            </ul>
+          </div>
+        )}
+
+        <div className="flex justify-between items-center mb-6">
+          <h2 className="text-2xl font-bold text-gray-800">Commandes à préparer</h2>
+          {queue.orders.length > 1 && (
+            <button
+              onClick={() => bulkUpdateStatus(queue.orders.map(order => order.id), 'ready')}
+              className="bg-green-600 text-white px-4 py-2 rounded hover:bg-green-700 font-medium"
+            >
+              Tout marquer prêt
+            </button>
+          )}
+        </div>
         
         <div className="grid gap-6 md:grid-cols-2 lg:grid-cols-3">
-          {orders.filter(order => order.status === 'in_kitchen').map(order => (
+          {queue.orders.map(order => (
             <div key={order.id} className="bg-white rounded-lg shadow-md p-6 border-l-4 border-orange-500">
               <div className="flex justify-between items-start mb-4">
                 <div>
@@ -700,9 +928,22 @@ const ChefDashboard = () => {
                 <h4 className="font-semibold mb-2">Articles:</h4>
                 <ul className="space-y-1">
                   {order.items.map(item => (
-                    <li key={item.menu_item_id} className="flex justify-between">
-                      <span>{item.menu_item_name}</span>
-                      <span className="font-medium">x{item.quantity}</span>
+                    <li key={item.line_id || item.menu_item_id} className="flex justify-between items-center">
+                      <span className={item.status === 'done' ? 'line-through text-gray-400' : ''}>
+                        {item.menu_item_name} <span className="font-medium">x{item.quantity}</span>
+                      </span>
+                      {item.line_id && (
+                        <button
+                          onClick={() => advanceItem(order, item)}
+                          className={`px-2 py-1 rounded text-xs font-medium ${
+                            item.status === 'done' ? 'bg-green-100 text-green-800' :
+                            item.status === 'cooking' ? 'bg-orange-100 text-orange-800' :
+                            'bg-gray-100 text-gray-800'
+                          }`}
+                        >
+                          {item.status === 'done' ? 'Fait' : item.status === 'cooking' ? 'En cuisson' : 'En attente'}
+                        </button>
+                      )}
                     </li>
                   ))}
                 </ul>
@@ -723,7 +964,7 @@ const ChefDashboard = () => {
           ))}
         </div>
 
-        {orders.filter(order => order.status === 'in_kitchen').length === 0 && (
+        {queue.orders.length === 0 && (
           <div className="text-center py-12">
             <p className="text-gray-500 text-lg">Aucune commande en attente</p>
           </div>
@@ -768,28 +1009,11 @@ const CashierDashboard = () => {
   const [orders, setOrders] = useState([]);
   const { user, logout } = useAuth();
 
-  useEffect(() => {
-    fetchOrders();
-    // Auto-refresh orders every 30 seconds
-    const interval = setInterval(fetchOrders, 30000);
-    return () => clearInterval(interval);
-  }, []);
-
-  const fetchOrders = async () => {
-    try {
-      const response = await axios.get(`${API}/orders`);
-      setOrders(response.data);
-    } catch (error) {
-      console.error('Failed to fetch orders:', error);
-    }
-  };
+  const fetchOrders = useOrderStream(setOrders);
 
   const markOrderPaid = async (orderId) => {
     try {
-      await axios.put(`${API}/orders/${orderId}`, {
-        status: 'paid'
-      });
-      fetchOrders();
+      await sendIdempotent('put', `${API}/orders/${orderId}`, { status: 'paid' }, `paid-${orderId}`);
       alert('Commande marquée comme payée!');
     } catch (error) {
       console.error('Failed to mark order paid:', error);
@@ -828,7 +1052,19 @@ const CashierDashboard = () => {
 
       <div className="p-6">
         {/* Ready to Pay Orders */}
-        <h2 className="text-2xl font-bold text-gray-800 mb-6">Commandes prêtes à encaisser</h2>
+        <div className="flex justify-between items-center mb-6">
+          <h2 className="text-2xl font-bold text-gray-800">Commandes prêtes à encaisser</h2>
+          {orders.filter(order => order.status === 'ready').length > 1 && (
+            <button
+              onClick={() => bulkUpdateStatus(
+                orders.filter(order => order.status === 'ready').map(order => order.id), 'paid'
+              )}
+              className="bg-green-600 text-white px-4 py-2 rounded hover:bg-green-700 font-medium"
+            >
+              Tout encaisser
+            </button>
+          )}
+        </div>
         
         <div className="grid gap-6 md:grid-cols-2 lg:grid-cols-3">
           {orders.filter(order => order.status === 'ready').map(order => (
@@ -943,6 +1179,7 @@ const CashierDashboard = () => {
 const AdminDashboard = () => {
   const [activeTab, setActiveTab] = useState('orders');
   const [orders, setOrders] = useState([]);
+  const [ordersCursor, setOrdersCursor] = useState(null);
   const [users, setUsers] = useState([]);
   const [menu, setMenu] = useState([]);
   const [showCreateUser, setShowCreateUser] = useState(false);
@@ -955,10 +1192,14 @@ const AdminDashboard = () => {
     fetchMenu();
   }, []);
 
-  const fetchOrders = async () => {
+  // Newest orders first, one page at a time: older history is only read when asked for
+  const fetchOrders = async (after = null) => {
     try {
-      const response = await axios.get(`${API}/orders`);
-      setOrders(response.data);
+      // The orders table only shows summary columns, skip the items
+      const params = { fields: 'table_number,server_name,status,total_amount', newest_first: true };
+      const response = await axios.get(`${API}/orders`, { params: after ? { ...params, after } : params });
+      setOrders((current) => (after ? current.concat(response.data) : response.data));
+      setOrdersCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       console.error('Failed to fetch orders:', error);
     }
@@ -966,8 +1207,8 @@ const AdminDashboard = () => {
 
   const fetchUsers = async () => {
     try {
-      const response = await axios.get(`${API}/users`);
-      setUsers(response.data);
+      const { items } = await fetchAllPages(`${API}/users`);
+      setUsers(items);
     } catch (error) {
       console.error('Failed to fetch users:', error);
     }
@@ -975,8 +1216,8 @@ const AdminDashboard = () => {
 
   const fetchMenu = async () => {
     try {
-      const response = await axios.get(`${API}/menu`);
-      setMenu(response.data);
+      const { items } = await fetchAllPages(`${API}/menu`);
+      setMenu(items);
     } catch (error) {
       console.error('Failed to fetch menu:', error);
     }
@@ -1054,7 +1295,7 @@ const AdminDashboard = () => {
             <div className="flex justify-between items-center mb-6">
               <h2 className="text-2xl font-bold text-gray-800">Toutes les commandes</h2>
               <button
-                onClick={fetchOrders}
+                onClick={() => fetchOrders()}
                 className="bg-blue-600 text-white px-4 py-2 rounded hover:bg-blue-700"
               >
                 Actualiser
@@ -1121,6 +1362,16 @@ const AdminDashboard = () => {
                 </table>
               </div>
             </div>
+            {ordersCursor && (
+              <div className="text-center mt-4">
+                <button
+                  onClick={() => fetchOrders(ordersCursor)}
+                  className="bg-gray-200 text-gray-800 px-4 py-2 rounded hover:bg-gray-300"
+                >
+                  Charger plus
+                </button>
+              </div>
+            )}
           </div>
         )}
 
@@ -1131,7 +1382,7 @@ const AdminDashboard = () => {
         {activeTab === 'menu' && <MenuManagement menu={menu} fetchMenu={fetchMenu} deleteMenuItem={deleteMenuItem} />}
         
         {/* Stats Tab */}
-        {activeTab === 'stats' && <Statistics orders={orders} />}
+        {activeTab === 'stats' && <Statistics />}
       </div>
 
       {/* Footer */}
@@ -1374,31 +1625,29 @@ const MenuManagement = ({ menu, fetchMenu, deleteMenuItem }) => {
 };
 
 // Statistics Component
-const Statistics = ({ orders }) => {
-  const getTotalRevenue = () => {
-    return orders.filter(order => order.status === 'paid')
-                 .reduce((total, order) => total + order.total_amount, 0);
-  };
+const Statistics = () => {
+  const [stats, setStats] = useState(null);
 
-  const getOrdersByStatus = () => {
-    const counts = {};
-    orders.forEach(order => {
-      counts[order.status] = (counts[order.status] || 0) + 1;
-    });
-    return counts;
-  };
+  useEffect(() => {
+    fetchStats();
+  }, []);
 
-  const getRevenueByDay = () => {
-    const revenueByDay = {};
-    orders.filter(order => order.status === 'paid').forEach(order => {
-      const date = new Date(order.paid_at).toLocaleDateString('fr-FR');
-      revenueByDay[date] = (revenueByDay[date] || 0) + order.total_amount;
-    });
-    return revenueByDay;
+  // Aggregated server-side, the payload stays small whatever the order history
+  const fetchStats = async () => {
+    try {
+      const response = await axios.get(`${API}/stats`);
+      setStats(response.data);
+    } catch (error) {
+      console.error('Failed to fetch statistics:', error);
+    }
   };
 
-  const orderCounts = getOrdersByStatus();
-  const dailyRevenue = getRevenueByDay();
+  if (!stats) {
+    return <p className="text-gray-600">Chargement...</p>;
+  }
+
+  const orderCounts = stats.orders_by_status;
+  const formatDay = (date) => date.split('-').reverse().join('/');
 
   return (
     <div>
@@ -1413,7 +1662,7 @@ const Statistics = ({ orders }) => {
             </div>
             <div className="ml-4">
               <p className="text-sm font-medium text-gray-600">Recettes totales</p>
-              <p className="text-2xl font-bold text-green-600">{getTotalRevenue().toFixed(2)} TND</p>
+              <p className="text-2xl font-bold text-green-600">{stats.revenue.toFixed(2)} TND</p>
             </div>
           </div>
         </div>
@@ -1425,7 +1674,7 @@ const Statistics = ({ orders }) => {
             </div>
             <div className="ml-4">
               <p className="text-sm font-medium text-gray-600">Total commandes</p>
-              <p className="text-2xl font-bold text-blue-600">{orders.length}</p>
+              <p className="text-2xl font-bold text-blue-600">{stats.total_orders}</p>
             </div>
           </div>
         </div>
@@ -1459,14 +1708,27 @@ const Statistics = ({ orders }) => {
       <div className="bg-white rounded-lg shadow-md p-6">
         <h3 className="text-lg font-semibold mb-4">Recettes par jour</h3>
         <div className="space-y-3">
-          {Object.entries(dailyRevenue).map(([date, revenue]) => (
+          {stats.revenue_by_day.map(({ date, revenue }) => (
             <div key={date} className="flex justify-between items-center p-3 bg-gray-50 rounded">
-              <span className="font-medium">{date}</span>
+              <span className="font-medium">{formatDay(date)}</span>
               <span className="text-green-600 font-bold">{revenue.toFixed(2)} TND</span>
             </div>
           ))}
         </div>
       </div>
+
+      {/* Top Items */}
+      <div className="bg-white rounded-lg shadow-md p-6 mt-6">
+        <h3 className="text-lg font-semibold mb-4">Plats les plus vendus</h3>
+        <div className="space-y-3">
+          {stats.top_items.map((item) => (
+            <div key={item.menu_item_id} className="flex justify-between items-center p-3 bg-gray-50 rounded">
+              <span className="font-medium">{item.name} x{item.quantity}</span>
+              <span className="text-green-600 font-bold">{item.revenue.toFixed(2)} TND</span>
+            </div>
+          ))}
+        </div>
+      </div>
     </div>
   );
 };
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+EdRina Resto Handler Benchmark
+Drives the FastAPI app in this process through an ASGI client on the
+in-memory storage backend, so the timings cover routing, auth, validation
+and serialization only, without network or database latency:
+
+    python handler_benchmark.py --orders 1000 --iterations 200
+
+Compare runs before and after a change to the handler stack; use
+load_test.py for end-to-end numbers against a real server.
+
+--serialization times turning 1000 stored orders into a response body with
+FastAPI's response_model path (the former default) against dump_orders, the
+list handlers' serializer, both with orjson and with its FAST_JSON=false fallback.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+import timeit
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+ADMIN_USERNAME = "admin"
+ADMIN_PASSWORD = "admin123"
+STAFF_PASSWORD = "bench123"
+
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, int(round(fraction * len(sorted_samples))) - 1))
+    return sorted_samples[index]
+
+
+class HandlerBenchmark:
+    def __init__(self, args, server, client):
+        self.args = args
+        self.server = server
+        self.client = client
+        self.headers = {}
+        self.menu = []
+        self.order_ids = []
+        self.results = []
+        self.stored_orders = []
+
+    async def login(self, username, password):
+        response = await self.client.post("/api/auth/login", json={"username": username, "password": password})
+        response.raise_for_status()
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def setup(self):
+        """Create one account per role and seed the orders table"""
+        (await self.client.post("/api/init")).raise_for_status()
+        self.headers["admin"] = await self.login(ADMIN_USERNAME, ADMIN_PASSWORD)
+        for role in ["serveur", "chef", "caisse"]:
+            user_data = {"username": f"bench_{role}", "password": STAFF_PASSWORD, "role": role}
+            response = await self.client.post("/api/auth/register", json=user_data, headers=self.headers["admin"])
+            response.raise_for_status()
+            self.headers[role] = await self.login(user_data["username"], STAFF_PASSWORD)
+
+        self.menu = (await self.client.get("/api/menu")).json()
+        for _ in range(self.args.orders):
+            response = await self.client.post("/api/orders", json=self.order_body(), headers=self.headers["serveur"])
+            response.raise_for_status()
+            self.order_ids.append(response.json()["id"])
+
+    def order_body(self):
+        return {
+            "table_number": random.randint(1, 8),
+            "items": [
+                {
+                    "menu_item_id": item["id"],
+                    "menu_item_name": item["name"],
+                    "quantity": random.randint(1, 3),
+                    "price": item["price"],
+                }
+                for item in random.sample(self.menu, random.randint(1, min(4, len(self.menu))))
+            ],
+        }
+
+    async def measure(self, name, call):
+        samples = []
+        statuses = set()
+        for _ in range(self.args.iterations):
+            started = time.perf_counter()
+            response = await call()
+            samples.append(time.perf_counter() - started)
+            statuses.add(response.status_code)
+        self.results.append((name, sorted(samples), statuses))
+
+    async def run(self):
+        await self.setup()
+        get = self.client.get
+        await self.measure("GET /menu", lambda: get("/api/menu"))
+        await self.measure("GET /auth/me", lambda: get("/api/auth/me", headers=self.headers["serveur"]))
+        await self.measure(f"GET /orders (limit {self.args.orders})", lambda: get(
+            "/api/orders", params={"limit": self.args.orders}, headers=self.headers["admin"]
+        ))
+        await self.measure(f"GET /orders?view=summary (limit {self.args.orders})", lambda: get(
+            "/api/orders", params={"limit": self.args.orders, "view": "summary"}, headers=self.headers["admin"]
+        ))
+        await self.measure("GET /orders/table/{n}", lambda: get("/api/orders/table/1", headers=self.headers["serveur"]))
+        await self.measure("POST /orders", lambda: self.client.post(
+            "/api/orders", json=self.order_body(), headers=self.headers["serveur"]
+        ))
+        await self.measure("PUT /orders/{id} (items)", lambda: self.client.put(
+            f"/api/orders/{random.choice(self.order_ids)}",
+            json={"items": self.order_body()["items"]},
+            headers=self.headers["serveur"],
+        ))
+        await self.measure("GET /stats", lambda: get("/api/stats", headers=self.headers["admin"]))
+        if self.args.serialization:
+            self.stored_orders = await self.server.storage.orders.list_page({}, 1000)
+
+    def serialization_report(self):
+        """Time to render 1000 stored orders as a response body, per serialization path"""
+        from typing import List
+        from fastapi.responses import JSONResponse
+        from fastapi.routing import serialize_response
+        from fastapi.utils import create_response_field
+
+        server = self.server
+        orders = self.stored_orders
+        field = create_response_field(name="orders", type_=List[server.Order])
+        loop = asyncio.new_event_loop()
+
+        def response_model_path():
+            models = [server.Order(**order) for order in orders]
+            return JSONResponse(loop.run_until_complete(serialize_response(field=field, response_content=models))).body
+
+        def dump_orders_path(fast_json):
+            # The handlers' own serializer, defaults filling included, with FAST_JSON forced either way
+            def render():
+                server.FAST_JSON = fast_json
+                return server.dump_orders(orders)
+            return render
+
+        paths = [
+            ("response_model + json (before)", response_model_path),
+            ("dump_orders, FAST_JSON=false", dump_orders_path(False)),
+        ]
+        if server.orjson is not None:
+            paths.append(("dump_orders, FAST_JSON=true (after)", dump_orders_path(True)))
+        fast_json = server.FAST_JSON
+
+        print(f"\nSerialization of {len(orders)} stored orders")
+        for name, render in paths:
+            seconds = min(timeit.repeat(render, number=5, repeat=3)) / 5
+            print(f"  {name:<38}{seconds * 1000 / len(orders) * 1000:>9.2f} ms per 1000 orders")
+        server.FAST_JSON = fast_json
+        loop.close()
+
+    def report(self):
+        print("\n" + "=" * 96)
+        print(f"⏱️ HANDLER BENCHMARK ({self.args.orders} orders, {self.args.iterations} iterations)")
+        print("=" * 96)
+        print(f"{'endpoint':<46}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}  statuses")
+        print("-" * 96)
+        for name, samples, statuses in self.results:
+            print(
+                f"{name:<46}"
+                f"{percentile(samples, 0.50) * 1000:>9.2f}"
+                f"{percentile(samples, 0.95) * 1000:>9.2f}"
+                f"{percentile(samples, 0.99) * 1000:>9.2f}"
+                f"{samples[-1] * 1000:>9.2f}  {', '.join(str(code) for code in sorted(statuses))}"
+            )
+
+
+async def main(args):
+    os.environ["STORAGE_BACKEND"] = "memory"
+    # Default bcrypt cost would dominate the setup logins without telling anything about the handlers
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    sys.path.insert(0, BACKEND_DIR)
+
+    import httpx
+    import server
+
+    # One INFO line per request would swamp the report
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    random.seed(args.seed)
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.app.router.lifespan_context(server.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            benchmark = HandlerBenchmark(args, server, client)
+            await benchmark.run()
+    return benchmark
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="EdRina Resto in-process handler benchmark")
+    parser.add_argument("--orders", type=int, default=1000, help="orders seeded before measuring")
+    parser.add_argument("--iterations", type=int, default=200, help="requests measured per endpoint")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for generated orders")
+    parser.add_argument("--serialization", action="store_true", help="also compare order serialization paths")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    result = asyncio.run(main(arguments))
+    result.report()
+    if arguments.serialization:
+        # Runs outside the benchmark's event loop, the FastAPI path needs one of its own
+        result.serialization_report()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+EdRina Resto Load Test
+Simulates a restaurant service against a local backend and reports
+latency percentiles and throughput per endpoint.
+
+By default the backend is started locally on the in-memory storage backend
+(STORAGE_BACKEND=memory), so nothing outside this machine is touched:
+
+    python load_test.py --servers 6 --chefs 2 --cashiers 1 --duration 60
+
+Use --mongo-url to run the spawned backend against a real local MongoDB,
+or --base-url to load an already running backend.
+"""
+
+import argparse
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from urllib.parse import quote
+
+import requests
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+ADMIN_USERNAME = "admin"
+ADMIN_PASSWORD = "admin123"
+STAFF_PASSWORD = "load123"
+
+# Collapse ids so every order update is reported under one endpoint
+ID_PATTERN = re.compile(r"/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+
+class LatencyRecorder:
+    """Thread-safe latency and status samples per endpoint"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, seconds, status_code):
+        with self.lock:
+            self.samples[endpoint].append(seconds)
+            self.statuses[endpoint][status_code] += 1
+
+    @staticmethod
+    def percentile(sorted_samples, fraction):
+        if not sorted_samples:
+            return 0.0
+        index = min(len(sorted_samples) - 1, max(0, int(round(fraction * len(sorted_samples))) - 1))
+        return sorted_samples[index]
+
+    def report(self, elapsed):
+        print("\n" + "=" * 104)
+        print("📊 LOAD TEST RESULTS")
+        print("=" * 104)
+        print(f"{'endpoint':<32}{'count':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}  statuses")
+        print("-" * 104)
+        total = 0
+        for endpoint in sorted(self.samples):
+            samples = sorted(self.samples[endpoint])
+            total += len(samples)
+            statuses = ", ".join(f"{code}:{count}" for code, count in sorted(self.statuses[endpoint].items()))
+            print(
+                f"{endpoint:<32}{len(samples):>8}{len(samples) / elapsed:>9.1f}"
+                f"{self.percentile(samples, 0.50) * 1000:>9.1f}"
+                f"{self.percentile(samples, 0.95) * 1000:>9.1f}"
+                f"{self.percentile(samples, 0.99) * 1000:>9.1f}"
+                f"{samples[-1] * 1000:>9.1f}  {statuses}"
+            )
+        print("-" * 104)
+        print(f"Total: {total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+
+
+class Client:
+    """One staff terminal with its own keep-alive connection"""
+
+    def __init__(self, base_url, recorder, token=None):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.session = requests.Session()
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def request(self, method, endpoint, data=None, action=None):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{self.base_url}{endpoint}", json=data, timeout=30)
+            status_code = response.status_code
+        except requests.exceptions.RequestException:
+            response = None
+            status_code = "error"
+        name = f"{method} {ID_PATTERN.sub('/{id}', endpoint.split('?')[0])}"
+        if action:
+            name += f" ({action})"
+        self.recorder.record(name, time.perf_counter() - started, status_code)
+        return response
+
+    def get_all_pages(self, endpoint):
+        """Every item of a paginated list, following X-Next-Cursor like the frontend, None on failure"""
+        items = []
+        after = None
+        while True:
+            separator = "&" if "?" in endpoint else "?"
+            response = self.request("GET", f"{endpoint}{separator}after={quote(after)}" if after else endpoint)
+            if response is None or response.status_code != 200:
+                return None
+            items.extend(response.json())
+            after = response.headers.get("X-Next-Cursor")
+            if not after:
+                return items
+
+
+class RestaurantLoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.base_url = args.base_url or f"http://127.0.0.1:{args.port}/api"
+        self.recorder = LatencyRecorder()
+        self.stop_event = threading.Event()
+        self.backend = None
+        self.menu = []
+
+    def start_backend(self):
+        if self.args.base_url:
+            return
+        command = [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(self.args.port)]
+        if self.args.mongo_url:
+            command += ["--mongo-url", self.args.mongo_url]
+        self.backend = subprocess.Popen(command)
+
+        for _ in range(100):
+            try:
+                requests.get(f"{self.base_url}/menu", timeout=1)
+                return
+            except requests.exceptions.RequestException:
+                time.sleep(0.1)
+        raise RuntimeError("Backend did not start")
+
+    def stop_backend(self):
+        if self.backend:
+            self.backend.terminate()
+            self.backend.wait()
+
+    def login(self, username, password):
+        response = requests.post(f"{self.base_url}/auth/login", json={"username": username, "password": password})
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+    def setup_staff(self):
+        """Create one account per simulated terminal"""
+        requests.post(f"{self.base_url}/init")
+        admin_token = self.login(ADMIN_USERNAME, ADMIN_PASSWORD)
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        run_id = uuid.uuid4().hex[:6]
+
+        staff = {"serveur": [], "chef": [], "caisse": []}
+        counts = {"serveur": self.args.servers, "chef": self.args.chefs, "caisse": self.args.cashiers}
+        for role, count in counts.items():
+            for index in range(count):
+                username = f"load_{role}_{run_id}_{index}"
+                user_data = {"username": username, "password": STAFF_PASSWORD, "role": role}
+                requests.post(f"{self.base_url}/auth/register", json=user_data, headers=headers).raise_for_status()
+                staff[role].append(self.login(username, STAFF_PASSWORD))
+
+        self.menu = requests.get(f"{self.base_url}/menu").json()
+        return staff
+
+    def pause(self, mean_interval):
+        # Poisson arrivals, so terminals do not fire in lockstep
+        self.stop_event.wait(random.expovariate(1.0 / mean_interval))
+
+    def random_items(self):
+        return [
+            {
+                "menu_item_id": item["id"],
+                "menu_item_name": item["name"],
+                "quantity": random.randint(1, 3),
+                "price": item["price"],
+            }
+            for item in random.sample(self.menu, random.randint(1, min(4, len(self.menu))))
+        ]
+
+    def server_terminal(self, token):
+        client = Client(self.base_url, self.recorder, token)
+        client.request("GET", "/menu")
+        open_orders = []
+        while not self.stop_event.is_set():
+            response = client.request("POST", "/orders", {
+                "table_number": random.randint(1, 8),
+                "items": self.random_items(),
+            })
+            if response is not None and response.status_code == 200:
+                open_orders.append(response.json()["id"])
+
+            if open_orders and random.random() < self.args.modify_ratio:
+                client.request("PUT", f"/orders/{random.choice(open_orders)}", {"items": self.random_items()}, "items")
+
+            client.request("GET", "/orders")
+            open_orders = open_orders[-10:]
+            self.pause(self.args.order_interval)
+
+    def chef_terminal(self, token):
+        client = Client(self.base_url, self.recorder, token)
+        while not self.stop_event.is_set():
+            # The kitchen screen reads its queue, oldest order first, however long the history gets
+            response = client.request("GET", "/kitchen/queue")
+            if response is not None and response.status_code == 200:
+                waiting = response.json()["orders"]
+                if waiting:
+                    client.request("PUT", f"/orders/{waiting[0]['id']}", {"status": "ready"}, "ready")
+            self.pause(self.args.ready_interval)
+
+    def cashier_terminal(self, token):
+        client = Client(self.base_url, self.recorder, token)
+        while not self.stop_event.is_set():
+            # Paid orders pile up on the first pages, ready ones can be on any page
+            orders = client.get_all_pages("/orders")
+            if orders is not None:
+                ready = [order for order in orders if order["status"] == "ready"]
+                if ready:
+                    client.request("PUT", f"/orders/{random.choice(ready)['id']}", {"status": "paid"}, "paid")
+            self.pause(self.args.pay_interval)
+
+    def run(self):
+        print("🍽️ EdRina Resto Load Test")
+        self.start_backend()
+        try:
+            staff = self.setup_staff()
+            print(
+                f"Running {self.args.servers} servers, {self.args.chefs} chefs and "
+                f"{self.args.cashiers} cashiers for {self.args.duration}s against {self.base_url}"
+            )
+
+            threads = []
+            for role, target in [
+                ("serveur", self.server_terminal),
+                ("chef", self.chef_terminal),
+                ("caisse", self.cashier_terminal),
+            ]:
+                for token in staff[role]:
+                    threads.append(threading.Thread(target=target, args=(token,), daemon=True))
+
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            self.stop_event.wait(self.args.duration)
+            self.stop_event.set()
+            for thread in threads:
+                thread.join(timeout=30)
+
+            self.recorder.report(time.perf_counter() - started)
+        finally:
+            self.stop_backend()
+
+
+def serve(args):
+    """Run the backend in this process, on in-memory storage unless a URL is given"""
+    if args.mongo_url:
+        os.environ["STORAGE_BACKEND"] = "mongo"
+        os.environ["MONGO_URL"] = args.mongo_url
+        os.environ.setdefault("DB_NAME", f"load_test_{uuid.uuid4().hex[:8]}")
+    else:
+        os.environ["STORAGE_BACKEND"] = "memory"
+    sys.path.insert(0, BACKEND_DIR)
+
+    import uvicorn
+    import server
+
+    uvicorn.run(server.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="EdRina Resto load test")
+    parser.add_argument("--servers", type=int, default=6, help="simulated server terminals")
+    parser.add_argument("--chefs", type=int, default=2, help="simulated kitchen screens")
+    parser.add_argument("--cashiers", type=int, default=1, help="simulated cashier terminals")
+    parser.add_argument("--duration", type=float, default=60, help="test duration in seconds")
+    parser.add_argument("--order-interval", type=float, default=5.0, help="mean seconds between orders per server")
+    parser.add_argument("--ready-interval", type=float, default=3.0, help="mean seconds between chef refreshes")
+    parser.add_argument("--pay-interval", type=float, default=4.0, help="mean seconds between cashier refreshes")
+    parser.add_argument("--modify-ratio", type=float, default=0.2, help="probability a server edits an order")
+    parser.add_argument("--port", type=int, default=8765, help="port of the spawned backend")
+    parser.add_argument("--mongo-url", help="run the spawned backend against this MongoDB")
+    parser.add_argument("--base-url", help="load an already running backend, e.g. http://localhost:8001/api")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    if arguments.serve:
+        serve(arguments)
+    else:
+        RestaurantLoadTest(arguments).run()
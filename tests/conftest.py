@@ -0,0 +1,83 @@
+"""Fixtures driving the FastAPI app in process on the in-memory storage backend."""
+
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+# Read by server.py at import time
+os.environ["STORAGE_BACKEND"] = "memory"
+# Default bcrypt cost would make every login slow without testing anything more
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ["ORDERS_ARCHIVE_AFTER_HOURS"] = "0"
+os.environ["EVENT_LOOP_LAG_INTERVAL_SECONDS"] = "0"
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx  # noqa: E402
+import server  # noqa: E402
+from metrics import instrument_storage  # noqa: E402
+from storage import MemoryStorage  # noqa: E402
+
+STAFF_PASSWORD = "test123"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    # Every test starts from an empty database and empty caches
+    monkeypatch.setattr(server, "storage", instrument_storage(MemoryStorage(), server.STORAGE_SECONDS))
+    monkeypatch.setattr(server, "user_cache", server.UserCache(server.USER_CACHE_TTL_SECONDS, 0))
+    monkeypatch.setattr(server, "menu_cache", server.MenuCache(server.MENU_CACHE_TTL_SECONDS))
+
+
+@pytest.fixture
+async def client():
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test/api") as client:
+        yield client
+
+
+async def login(client, username, password):
+    response = await client.post("/auth/login", json={"username": username, "password": password})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+async def staff(client):
+    """Auth headers per role, on a system initialized with the sample menu."""
+    await client.post("/init")
+    headers = {"admin": await login(client, "admin", "admin123")}
+    for role in ["serveur", "chef", "caisse"]:
+        user_data = {"username": role, "password": STAFF_PASSWORD, "role": role}
+        response = await client.post("/auth/register", json=user_data, headers=headers["admin"])
+        assert response.status_code == 200
+        headers[role] = await login(client, role, STAFF_PASSWORD)
+    return headers
+
+
+@pytest.fixture
+async def menu(client, staff):
+    response = await client.get("/menu")
+    return response.json()
+
+
+def order_line(menu_item, quantity=1):
+    return {
+        "menu_item_id": menu_item["id"],
+        "menu_item_name": menu_item["name"],
+        "quantity": quantity,
+        "price": menu_item["price"],
+    }
+
+
+async def place_order(client, staff, items, table_number=1):
+    response = await client.post("/orders", json={"table_number": table_number, "items": items}, headers=staff["serveur"])
+    assert response.status_code == 200
+    return response.json()
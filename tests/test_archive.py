@@ -0,0 +1,53 @@
+import copy
+
+import pytest
+
+import server
+
+from .conftest import order_line, place_order
+
+pytestmark = pytest.mark.anyio
+
+
+async def pay(client, staff, order):
+    await client.put(f"/orders/{order['id']}", json={"status": "ready"}, headers=staff["chef"])
+    await client.put(f"/orders/{order['id']}", json={"status": "paid"}, headers=staff["caisse"])
+
+
+async def list_all(client, headers, params):
+    ids, after = [], None
+    while True:
+        response = await client.get("/orders", params={**params, "after": after} if after else params, headers=headers)
+        assert response.status_code == 200
+        ids += [order["id"] for order in response.json()]
+        after = response.headers.get("X-Next-Cursor")
+        if not after:
+            return ids
+
+
+async def test_admin_list_includes_archived_orders(client, staff, menu, monkeypatch):
+    monkeypatch.setattr(server, "ORDERS_ARCHIVE_AFTER_HOURS", 0)
+    orders = [await place_order(client, staff, [order_line(menu[0])], table_number=n) for n in (1, 2, 3)]
+    for order in orders[:2]:
+        await pay(client, staff, order)
+    assert await server.archive_paid_orders() == 2
+
+    placed = [order["id"] for order in orders]
+    assert await list_all(client, staff["admin"], {"limit": 2}) == placed
+    assert await list_all(client, staff["admin"], {"limit": 2, "newest_first": "true"}) == placed[::-1]
+
+
+async def test_order_caught_mid_move_is_listed_once(client, staff, menu):
+    orders = [await place_order(client, staff, [order_line(menu[0])]) for _ in range(4)]
+    # Copied to the archive but not yet deleted from the hot collection
+    archive = server.storage.orders.archive
+    for order in orders[:3]:
+        archive[order["id"]] = copy.deepcopy(await server.storage.orders.get(order["id"]))
+
+    for limit in (1, 2, 3):
+        assert await list_all(client, staff["admin"], {"limit": limit}) == [order["id"] for order in orders]
+
+
+async def test_date_ranges_are_admin_only(client, staff):
+    response = await client.get("/orders", params={"start": "2000-01-01T00:00:00"}, headers=staff["serveur"])
+    assert response.status_code == 403
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import server
+
+from .conftest import STAFF_PASSWORD
+
+pytestmark = pytest.mark.anyio
+
+
+async def delete_user(client, staff, role):
+    user_id = (await client.get("/auth/me", headers=staff[role])).json()["id"]
+    response = await client.delete(f"/users/{user_id}", headers=staff["admin"])
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("trust_claims", [False, True])
+async def test_deleted_user_is_refused_by_every_worker(client, staff, monkeypatch, trust_claims):
+    monkeypatch.setattr(server, "AUTH_TRUST_TOKEN_CLAIMS", trust_claims)
+    assert (await client.get("/orders", headers=staff["serveur"])).status_code == 200
+    await delete_user(client, staff, "serveur")
+
+    # Another worker, or this one after a restart, has none of the deleting worker's memory
+    monkeypatch.setattr(server, "user_cache", server.UserCache(server.USER_CACHE_TTL_SECONDS, 0))
+    response = await client.get("/orders", headers=staff["serveur"])
+    assert response.status_code == 401
+    assert response.json()["detail"] == "User not found"
+
+    assert (await client.get("/orders", headers=staff["chef"])).status_code == 200
+
+
+async def test_revocations_end_with_the_last_token(client, staff):
+    await delete_user(client, staff, "serveur")
+    revocation, = await server.storage.revoked_users.list_active(datetime.utcnow())
+
+    later = datetime.utcnow() + timedelta(hours=server.JWT_EXPIRATION_HOURS, minutes=1)
+    assert revocation["expires_at"] < later
+    assert await server.storage.revoked_users.list_active(later) == []
+
+
+async def test_saturated_password_pool_answers_429(client, staff, monkeypatch):
+    pool = server.PasswordWorkerPool("thread", 1, 0)
+    monkeypatch.setattr(server, "password_pool", pool)
+    release = threading.Event()
+    verify_password = server.verify_password
+
+    def slow_verify_password(*args):
+        release.wait(5)
+        return verify_password(*args)
+
+    monkeypatch.setattr(server, "verify_password", slow_verify_password)
+    credentials = {"username": "serveur", "password": STAFF_PASSWORD}
+    first = asyncio.create_task(client.post("/auth/login", json=credentials))
+    while pool.pending == 0:
+        await asyncio.sleep(0.001)
+
+    response = await client.post("/auth/login", json=credentials)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    assert pool.rejected == 1
+
+    release.set()
+    assert (await first).status_code == 200
+    assert (await client.post("/auth/login", json=credentials)).status_code == 200
@@ -0,0 +1,76 @@
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import server
+
+from .conftest import order_line, place_order
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def event_hub(monkeypatch):
+    hub = server.OrderEventHub(server.ORDER_EVENTS_BUFFER_SIZE, server.ORDER_EVENTS_QUEUE_SIZE)
+    monkeypatch.setattr(server, "order_events", hub)
+    monkeypatch.setattr(server, "ORDER_EVENTS_KEEPALIVE_SECONDS", 0.01)
+    return hub
+
+
+def stream_request(headers=None):
+    headers = [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/api/orders/events", "headers": headers})
+
+
+async def open_stream(client, headers, last_event_id=None):
+    ticket = (await client.post("/orders/events/ticket", headers=headers)).json()["ticket"]
+    response = await server.stream_order_events(stream_request(), ticket=ticket, last_event_id=last_event_id)
+    messages = response.body_iterator
+    assert await messages.__anext__() == "retry: 3000\n\n"
+    return messages
+
+
+async def test_stream_takes_a_ticket_and_not_the_login_token(client, staff, menu, event_hub):
+    messages = await open_stream(client, staff["serveur"])
+    order = await place_order(client, staff, [order_line(menu[0])])
+    message = await messages.__anext__()
+    assert message.startswith(f"id: {event_hub.boot_id}-1\nevent: order\n")
+    assert order["id"] in message
+    await messages.aclose()
+
+    login_token = staff["serveur"]["Authorization"][7:]
+    with pytest.raises(HTTPException) as error:
+        await server.stream_order_events(stream_request(), ticket=login_token)
+    assert error.value.status_code == 401
+
+    # Nor does a ticket work as a login token
+    ticket = (await client.post("/orders/events/ticket", headers=staff["serveur"])).json()["ticket"]
+    response = await client.get("/orders", headers={"Authorization": f"Bearer {ticket}"})
+    assert response.status_code == 401
+
+
+async def test_event_ids_from_another_run_resync(client, staff, menu, event_hub):
+    await place_order(client, staff, [order_line(menu[0])])
+    await place_order(client, staff, [order_line(menu[1])])
+    user = server.User(**await server.storage.users.get_by_username("admin"))
+
+    resumed = event_hub.subscribe(user, event_hub.event_id(1))
+    assert not resumed.needs_resync
+    assert resumed.queue.get_nowait()["seq"] == 2
+
+    # Same sequence number, but issued by another process or before a restart
+    for last_event_id in ["0badb007-1", "1"]:
+        assert event_hub.subscribe(user, last_event_id).needs_resync
+
+
+async def test_deleted_user_stops_receiving_orders(client, staff, menu):
+    messages = await open_stream(client, staff["serveur"])
+    assert await messages.__anext__() == ": keepalive\n\n"
+
+    user_id = (await client.get("/auth/me", headers=staff["serveur"])).json()["id"]
+    await client.delete(f"/users/{user_id}", headers=staff["admin"])
+    # Revoked by another worker, this one only learns of it through storage
+    server.user_cache._revoked.clear()
+
+    with pytest.raises(StopAsyncIteration):
+        await messages.__anext__()
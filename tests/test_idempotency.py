@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+import server
+
+from .conftest import order_line
+
+pytestmark = pytest.mark.anyio
+
+
+def order_body(menu):
+    return {"table_number": 1, "items": [order_line(menu[0])]}
+
+
+async def test_repeated_key_replays_the_first_response(client, staff, menu):
+    headers = {**staff["serveur"], "Idempotency-Key": "order-1"}
+    first = await client.post("/orders", json=order_body(menu), headers=headers)
+    repeat = await client.post("/orders", json=order_body(menu), headers=headers)
+
+    assert first.status_code == repeat.status_code == 200
+    assert repeat.json() == first.json()
+    assert repeat.headers["Idempotent-Replayed"] == "true"
+    assert len(await server.storage.orders.list_page({}, 10)) == 1
+
+
+async def test_repeated_paid_transition_is_replayed(client, staff, menu):
+    order = (await client.post("/orders", json=order_body(menu), headers=staff["serveur"])).json()
+    await client.put(f"/orders/{order['id']}", json={"status": "ready"}, headers=staff["chef"])
+
+    headers = {**staff["caisse"], "Idempotency-Key": "pay-1"}
+    first = await client.put(f"/orders/{order['id']}", json={"status": "paid"}, headers=headers)
+    repeat = await client.put(f"/orders/{order['id']}", json={"status": "paid"}, headers=headers)
+
+    assert first.status_code == repeat.status_code == 200
+    assert repeat.json() == first.json()
+
+
+async def test_key_reused_for_a_different_request_is_rejected(client, staff, menu):
+    headers = {**staff["serveur"], "Idempotency-Key": "order-1"}
+    await client.post("/orders", json=order_body(menu), headers=headers)
+    response = await client.post("/orders", json={**order_body(menu), "table_number": 2}, headers=headers)
+
+    assert response.status_code == 422
+    assert len(await server.storage.orders.list_page({}, 10)) == 1
+
+
+async def test_key_still_in_progress_conflicts(client, staff, menu, monkeypatch):
+    started, release = asyncio.Event(), asyncio.Event()
+    place_order = server.place_order
+
+    async def slow_place_order(*args):
+        started.set()
+        await release.wait()
+        return await place_order(*args)
+
+    monkeypatch.setattr(server, "place_order", slow_place_order)
+    headers = {**staff["serveur"], "Idempotency-Key": "order-1"}
+    first = asyncio.create_task(client.post("/orders", json=order_body(menu), headers=headers))
+    await started.wait()
+
+    response = await client.post("/orders", json=order_body(menu), headers=headers)
+    assert response.status_code == 409
+
+    release.set()
+    assert (await first).status_code == 200
+    assert len(await server.storage.orders.list_page({}, 10)) == 1
+
+
+async def test_failed_request_releases_its_key(client, staff, menu):
+    headers = {**staff["serveur"], "Idempotency-Key": "order-1"}
+    response = await client.post("/orders", json={**order_body(menu), "table_number": 99}, headers=headers)
+    assert response.status_code == 400
+
+    # Not recorded, so the same key may carry the corrected request
+    response = await client.post("/orders", json=order_body(menu), headers=headers)
+    assert response.status_code == 200
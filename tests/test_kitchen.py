@@ -0,0 +1,40 @@
+import pytest
+
+import server
+
+from .conftest import order_line, place_order
+
+pytestmark = pytest.mark.anyio
+
+
+async def set_line_status(client, staff, order, index, status):
+    line_id = order["items"][index]["line_id"]
+    response = await client.put(f"/orders/{order['id']}/items/{line_id}", json={"status": status}, headers=staff["chef"])
+    assert response.status_code == 200
+
+
+async def test_queue_totals_what_is_left_to_cook(client, staff, menu, monkeypatch):
+    first = await place_order(client, staff, [order_line(menu[0], 3), order_line(menu[1])], table_number=1)
+    second = await place_order(client, staff, [order_line(menu[0], 2), order_line(menu[2])], table_number=2)
+    ready = await place_order(client, staff, [order_line(menu[1], 4)], table_number=3)
+    await set_line_status(client, staff, first, 0, "cooking")
+    await set_line_status(client, staff, second, 1, "done")
+    await client.put(f"/orders/{ready['id']}", json={"status": "ready"}, headers=staff["chef"])
+
+    # The order list is capped, the totals still cover every order in the kitchen
+    monkeypatch.setattr(server, "KITCHEN_QUEUE_LIMIT", 1)
+    response = await client.get("/kitchen/queue", headers=staff["chef"])
+    assert response.status_code == 200
+    queue = response.json()
+    assert [order["id"] for order in queue["orders"]] == [first["id"]]
+    assert [(row["menu_item_id"], row["quantity"], row["cooking"], row["orders"]) for row in queue["to_prepare"]] == [
+        (menu[0]["id"], 5, 3, 2),
+        (menu[1]["id"], 1, 0, 1),
+    ]
+    assert queue["to_prepare"][0]["name"] == menu[0]["name"]
+    assert queue["to_prepare"][0]["oldest_at"] == first["created_at"]
+
+
+async def test_queue_is_for_the_kitchen(client, staff):
+    response = await client.get("/kitchen/queue", headers=staff["serveur"])
+    assert response.status_code == 403
@@ -0,0 +1,34 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_unchanged_menu_is_not_modified(client, staff, menu):
+    response = await client.get("/menu")
+    etag = response.headers["ETag"]
+    assert "max-age" in response.headers["Cache-Control"]
+
+    response = await client.get("/menu", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    item = menu[0]
+    update = {"name": item["name"], "price": item["price"] + 1}
+    response = await client.put(f"/menu/{item['id']}", json=update, headers=staff["chef"])
+    assert response.status_code == 200
+
+    response = await client.get("/menu", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()[0]["price"] == item["price"] + 1
+
+
+async def test_menu_pages_cover_the_snapshot(client, menu):
+    names, after = [], None
+    while True:
+        response = await client.get("/menu", params={"limit": 2, "after": after} if after else {"limit": 2})
+        names += [item["name"] for item in response.json()]
+        after = response.headers.get("X-Next-Cursor")
+        if not after:
+            break
+    assert names == [item["name"] for item in menu]
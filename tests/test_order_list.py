@@ -0,0 +1,51 @@
+import pytest
+
+from .conftest import order_line, place_order
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_unchanged_list_is_not_modified(client, staff, menu):
+    order = await place_order(client, staff, [order_line(menu[0])])
+    response = await client.get("/orders", headers=staff["chef"])
+    etag = response.headers["ETag"]
+
+    response = await client.get("/orders", headers={**staff["chef"], "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # A change to a listed order, a new order, and another view each miss
+    line_id = order["items"][0]["line_id"]
+    await client.put(f"/orders/{order['id']}/items/{line_id}", json={"status": "done"}, headers=staff["chef"])
+    response = await client.get("/orders", headers={**staff["chef"], "If-None-Match": etag})
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    await place_order(client, staff, [order_line(menu[1])], table_number=2)
+    response = await client.get("/orders", headers={**staff["chef"], "If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+
+    response = await client.get("/orders", headers={**staff["serveur"], "If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 200
+
+
+async def test_large_list_is_compressed_and_still_revalidates(client, staff, menu):
+    for table_number in range(1, 9):
+        await place_order(client, staff, [order_line(menu[0]), order_line(menu[1])], table_number=table_number)
+
+    headers = {**staff["admin"], "Accept-Encoding": "gzip"}
+    response = await client.get("/orders", headers=headers)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert len(response.json()) == 8
+    # The compressed body is not the entity the ETag names
+    etag = response.headers["ETag"]
+    assert etag.startswith("W/")
+
+    response = await client.get("/orders", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = await client.get("/orders", headers={**staff["admin"], "Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert len(response.json()) == 8
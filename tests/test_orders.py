@@ -0,0 +1,166 @@
+import pytest
+
+import server
+
+from .conftest import order_line, place_order
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_create_prices_items_from_menu(client, staff, menu):
+    items = [{**order_line(menu[0], 2), "price": 0.01, "menu_item_name": "Free", "line_id": "x", "status": "done"},
+             order_line(menu[1])]
+    order = await place_order(client, staff, items)
+
+    assert [item["price"] for item in order["items"]] == [menu[0]["price"], menu[1]["price"]]
+    assert [item["menu_item_name"] for item in order["items"]] == [menu[0]["name"], menu[1]["name"]]
+    assert order["total_amount"] == round(menu[0]["price"] * 2 + menu[1]["price"], 3)
+    # Line ids and kitchen status are the server's
+    assert all(item["status"] == "queued" for item in order["items"])
+    assert "x" not in {item["line_id"] for item in order["items"]}
+    assert len({item["line_id"] for item in order["items"]}) == 2
+
+
+async def test_create_rejects_unknown_menu_item(client, staff, menu):
+    items = [order_line(menu[0]), {**order_line(menu[1]), "menu_item_id": "no-such-item"}]
+    response = await client.post("/orders", json={"table_number": 1, "items": items}, headers=staff["serveur"])
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown menu item: no-such-item"
+    assert await server.storage.orders.list_page({}, 10) == []
+
+
+async def test_create_and_put_reject_empty_items(client, staff, menu):
+    response = await client.post("/orders", json={"table_number": 1, "items": []}, headers=staff["serveur"])
+    assert response.status_code == 400
+
+    order = await place_order(client, staff, [order_line(menu[0])])
+    response = await client.put(f"/orders/{order['id']}", json={"items": []}, headers=staff["serveur"])
+    assert response.status_code == 400
+
+
+async def test_repeated_paid_transition_conflicts(client, staff, menu):
+    order = await place_order(client, staff, [order_line(menu[0])])
+    response = await client.put(f"/orders/{order['id']}", json={"status": "ready"}, headers=staff["chef"])
+    assert response.status_code == 200
+
+    response = await client.put(f"/orders/{order['id']}", json={"status": "paid"}, headers=staff["caisse"])
+    assert response.status_code == 200
+    assert response.json()["status"] == "paid"
+
+    response = await client.put(f"/orders/{order['id']}", json={"status": "paid"}, headers=staff["caisse"])
+    assert response.status_code == 409
+    # Revenue was recorded once
+    days = await server.storage.daily_stats.list_days(None, None)
+    assert sum(day["orders"] for day in days) == 1
+
+
+async def test_patch_with_stale_version_conflicts(client, staff, menu):
+    order = await place_order(client, staff, [order_line(menu[0])])
+    add = {"version": 0, "changes": [{"op": "add", "menu_item_id": menu[1]["id"], "quantity": 1}]}
+
+    response = await client.patch(f"/orders/{order['id']}", json=add, headers=staff["serveur"])
+    assert response.status_code == 200
+    assert response.json()["version"] == 1
+
+    response = await client.patch(f"/orders/{order['id']}", json=add, headers=staff["serveur"])
+    assert response.status_code == 409
+    stored = await server.storage.orders.get(order["id"])
+    assert len(stored["items"]) == 2
+
+
+async def test_edits_keep_kitchen_progress(client, staff, menu):
+    order = await place_order(client, staff, [order_line(menu[0], 3), order_line(menu[1])])
+    stale_items = order["items"]
+    line_id = stale_items[0]["line_id"]
+    response = await client.put(f"/orders/{order['id']}/items/{line_id}", json={"status": "done"}, headers=staff["chef"])
+    assert response.status_code == 200
+
+    # A PUT echoing lines read before the chef's change keeps the stored status
+    response = await client.put(f"/orders/{order['id']}", json={"items": stale_items}, headers=staff["serveur"])
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json()["items"]] == ["done", "queued"]
+
+    # Fewer portions leave the line done, more send it back to the kitchen
+    for quantity, status in [(2, "done"), (4, "queued")]:
+        version = (await server.storage.orders.get(order["id"]))["version"]
+        changes = [{"op": "quantity", "line_id": line_id, "quantity": quantity}]
+        response = await client.patch(
+            f"/orders/{order['id']}", json={"version": version, "changes": changes}, headers=staff["serveur"]
+        )
+        assert response.status_code == 200
+        assert response.json()["items"][0]["status"] == status
+
+
+async def test_put_rejects_unknown_and_repeated_lines(client, staff, menu):
+    order = await place_order(client, staff, [order_line(menu[0])])
+    line = order["items"][0]
+
+    for items in [[line, line], [{**line, "line_id": "no-such-line"}]]:
+        response = await client.put(f"/orders/{order['id']}", json={"items": items}, headers=staff["serveur"])
+        assert response.status_code == 400
+
+
+async def test_bulk_status_reports_each_order(client, staff, menu):
+    first = await place_order(client, staff, [order_line(menu[0])])
+    second = await place_order(client, staff, [order_line(menu[1])], table_number=2)
+    already_ready = await place_order(client, staff, [order_line(menu[2])], table_number=3)
+    await client.put(f"/orders/{already_ready['id']}", json={"status": "ready"}, headers=staff["chef"])
+
+    order_ids = [first["id"], "no-such-order", second["id"], already_ready["id"]]
+    response = await client.post("/orders/bulk-status", json={"order_ids": order_ids, "status": "ready"},
+                                 headers=staff["chef"])
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["updated"] == 2
+    assert [(result["id"], result["result"], result["status"]) for result in body["results"]] == [
+        (first["id"], "updated", "ready"),
+        ("no-such-order", "not_found", None),
+        (second["id"], "updated", "ready"),
+        (already_ready["id"], "conflict", "ready"),
+    ]
+    # How the write told its own orders apart is not part of them
+    listed = (await client.get("/orders", headers=staff["admin"])).json()
+    assert all(set(order) == set(server.Order.model_fields) for order in listed)
+
+
+async def test_bulk_status_checks_role(client, staff, menu):
+    order = await place_order(client, staff, [order_line(menu[0])])
+    response = await client.post("/orders/bulk-status", json={"order_ids": [order["id"]], "status": "ready"},
+                                 headers=staff["caisse"])
+    assert response.status_code == 403
+
+
+async def test_delta_reports_orders_leaving_the_view_as_removed(client, staff, menu):
+    order = await place_order(client, staff, [order_line(menu[0])])
+    response = await client.get("/orders", headers=staff["chef"])
+    cursor = response.headers["X-Orders-Cursor"]
+
+    await client.put(f"/orders/{order['id']}", json={"status": "ready"}, headers=staff["chef"])
+    await client.put(f"/orders/{order['id']}", json={"status": "paid"}, headers=staff["caisse"])
+
+    delta = (await client.get("/orders", params={"since": cursor}, headers=staff["chef"])).json()
+    assert delta["orders"] == []
+    assert delta["removed"] == [order["id"]]
+
+    delta = (await client.get("/orders", params={"since": cursor}, headers=staff["caisse"])).json()
+    assert [changed["id"] for changed in delta["orders"]] == [order["id"]]
+    assert delta["removed"] == []
+
+
+async def test_delta_continues_after_a_full_page(client, staff, menu, monkeypatch):
+    monkeypatch.setattr(server, "ORDERS_SYNC_MAX_CHANGES", 2)
+    placed = [(await place_order(client, staff, [order_line(menu[0])]))["id"] for _ in range(5)]
+
+    params = {"since": "2000-01-01T00:00:00"}
+    received = []
+    for _ in range(len(placed) + 1):
+        delta = (await client.get("/orders", params=params, headers=staff["admin"])).json()
+        received += [order["id"] for order in delta["orders"]]
+        if not delta["has_more"]:
+            break
+        params = {"since": delta["cursor"], "after_id": delta["after_id"]}
+
+    assert sorted(received) == sorted(placed)
+    assert len(received) == len(placed)
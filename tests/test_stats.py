@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import server
+
+from .conftest import order_line, place_order
+
+pytestmark = pytest.mark.anyio
+
+
+async def pay(client, staff, order):
+    await client.put(f"/orders/{order['id']}", json={"status": "ready"}, headers=staff["chef"])
+    response = await client.put(f"/orders/{order['id']}", json={"status": "paid"}, headers=staff["caisse"])
+    assert response.status_code == 200
+
+
+async def test_rollups_add_up_in_millimes(client, staff):
+    response = await client.post("/menu", json={"name": "Thé", "price": 0.1}, headers=staff["admin"])
+    tea = response.json()
+    for _ in range(10):
+        await pay(client, staff, await place_order(client, staff, [order_line(tea, 3)]))
+
+    day, = await server.storage.daily_stats.list_days(None, None)
+    assert day["revenue_millimes"] == 3000
+    assert day["items"][tea["id"]]["revenue_millimes"] == 3000
+
+    rollup = (await client.get("/stats", headers=staff["admin"])).json()
+    exact = (await client.get("/stats", params={"source": "orders"}, headers=staff["admin"])).json()
+    assert rollup["revenue"] == exact["revenue"] == 3.0
+    assert rollup["top_items"] == exact["top_items"]
+    assert rollup["servers"] == exact["servers"]
+    assert rollup["orders_by_status"] == exact["orders_by_status"] == {"paid": 10}
+
+
+async def test_bulk_payment_is_recorded_once_per_order(client, staff, menu):
+    orders = [await place_order(client, staff, [order_line(menu[0])], table_number=n) for n in (1, 2)]
+    order_ids = [order["id"] for order in orders]
+    await client.post("/orders/bulk-status", json={"order_ids": order_ids, "status": "ready"}, headers=staff["chef"])
+    for _ in range(2):
+        await client.post("/orders/bulk-status", json={"order_ids": order_ids, "status": "paid"}, headers=staff["caisse"])
+
+    stats = (await client.get("/stats", headers=staff["admin"])).json()
+    assert stats["paid_orders"] == 2
+    assert stats["revenue"] == menu[0]["price"] * 2
+
+
+def paid_order(menu_item, paid_at, quantity=1):
+    item = server.OrderItem(**order_line(menu_item, quantity))
+    return server.Order(
+        table_number=1, server_id="s1", server_name="Sami", items=[item],
+        total_amount=menu_item["price"] * quantity, status="paid", paid_at=paid_at,
+    )
+
+
+async def test_startup_seeds_empty_rollups_from_paid_orders(staff, menu):
+    now = datetime.utcnow()
+    for paid_at in (now - timedelta(days=3), now - timedelta(days=3), now):
+        await server.storage.orders.insert(paid_order(menu[0], paid_at).dict())
+
+    async with server.app.router.lifespan_context(server.app):
+        pass
+
+    days = await server.storage.daily_stats.list_days(None, None)
+    assert [day["orders"] for day in days] == [2, 1]
+
+    # Already seeded, a restart adds nothing
+    async with server.app.router.lifespan_context(server.app):
+        pass
+    assert [day["orders"] for day in await server.storage.daily_stats.list_days(None, None)] == [2, 1]
+
+
+async def test_rebuild_replaces_past_days_and_leaves_today(client, staff, menu):
+    now = datetime.utcnow()
+    past = paid_order(menu[0], now - timedelta(days=2))
+    await server.storage.orders.insert(past.dict())
+    await pay(client, staff, await place_order(client, staff, [order_line(menu[1])]))
+    # Drifted past rollup and a day with no paid orders left
+    await server.storage.daily_stats.increment(server.local_day(past.paid_at), {"orders": 5, "revenue_millimes": 1}, {})
+    await server.storage.daily_stats.increment(server.local_day(now - timedelta(days=5)), {"orders": 1}, {})
+
+    response = await client.post("/stats/rebuild", headers=staff["admin"])
+    assert response.status_code == 200
+
+    days = await server.storage.daily_stats.list_days(None, None)
+    assert [(day["date"], day["orders"]) for day in days] == [
+        (server.local_day(past.paid_at), 1),
+        (server.local_day(now), 1),
+    ]
+    assert days[0]["revenue_millimes"] == server.to_millimes(menu[0]["price"])
+
+
+async def test_rebuild_refuses_to_run_twice_at_once(client, staff):
+    async with server.maintenance_lock("daily_stats") as acquired:
+        assert acquired
+        response = await client.post("/stats/rebuild", headers=staff["admin"])
+    assert response.status_code == 409
+
+    response = await client.post("/stats/rebuild", headers=staff["admin"])
+    assert response.status_code == 200
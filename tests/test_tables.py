@@ -0,0 +1,49 @@
+from datetime import datetime
+
+import pytest
+
+import server
+
+from .conftest import order_line, place_order
+
+pytestmark = pytest.mark.anyio
+
+
+async def get_table(client, staff, table_number):
+    response = await client.get("/tables", headers=staff["serveur"])
+    assert response.status_code == 200
+    floor = response.json()
+    assert [table["table_number"] for table in floor] == list(range(1, server.TABLE_COUNT + 1))
+    return floor[table_number - 1]
+
+
+async def test_table_follows_its_open_orders(client, staff, menu):
+    first = await place_order(client, staff, [order_line(menu[0], 2)], table_number=3)
+    second = await place_order(client, staff, [order_line(menu[1])], table_number=3)
+    await client.put(f"/orders/{first['id']}", json={"status": "ready"}, headers=staff["chef"])
+
+    table = await get_table(client, staff, 3)
+    assert table["status"] == "ready"
+    assert [order["id"] for order in table["open_orders"]] == [first["id"], second["id"]]
+    assert table["running_total"] == round(first["total_amount"] + second["total_amount"], 3)
+    assert table["oldest_open_at"] == first["created_at"]
+    assert (await get_table(client, staff, 4))["status"] == "free"
+
+    # Paid through the bulk route, the table is free again
+    await client.post("/orders/bulk-status", json={"order_ids": [second["id"]], "status": "ready"},
+                      headers=staff["chef"])
+    await client.post("/orders/bulk-status", json={"order_ids": [first["id"], second["id"]], "status": "paid"},
+                      headers=staff["caisse"])
+    table = await get_table(client, staff, 3)
+    assert table["status"] == "free"
+    assert table["open_orders"] == []
+    assert table["running_total"] == 0
+
+
+async def test_older_state_never_replaces_a_newer_one(client, staff, menu):
+    order = await place_order(client, staff, [order_line(menu[0])], table_number=2)
+    stale = server.build_table_state(2, [], datetime(2000, 1, 1))
+    await server.storage.tables.replace_if_newer(stale)
+
+    table = await get_table(client, staff, 2)
+    assert [open_order["id"] for open_order in table["open_orders"]] == [order["id"]]